@@ -1,4 +1,4 @@
-from tunicorn.app import Application
+from tunicorn.app import run
 
 if __name__ == '__main__':
-    Application('%(prog)s [OPTIONS] [APP_MODULE]').run()
+    run()
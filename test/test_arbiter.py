@@ -0,0 +1,124 @@
+import logging
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None
+
+from tunicorn.app import DEFAULT_CONFIG
+from tunicorn.arbiter import Arbiter
+from tunicorn.config import Config
+from tunicorn.workers.base import Worker
+from tunicorn.workers.scoreboard import Scoreboard
+from tunicorn.workers.sync import SyncWorker
+
+try:
+    from tunicorn.workers.gthread import ThreadWorker
+except RuntimeError:
+    ThreadWorker = None
+
+
+class App(object):
+    def __init__(self, **settings):
+        self.config = Config('.', defaults=DEFAULT_CONFIG)
+        self.config.update(settings)
+        self.logger = logging.getLogger('test')
+        self.cwd = '.'
+
+
+class WorkerStub(object):
+    def __init__(self, age, slot):
+        self.age = age
+        self.slot = slot
+        self.retired = False
+        self.cpus = None
+        self.boot_started = time.time()
+
+
+class ArbiterTest(unittest.TestCase):
+    def arbiter(self, num_workers, **settings):
+        arbiter = Arbiter(App(**settings))
+        arbiter.scoreboard = Scoreboard(8)
+        for pid in range(num_workers):
+            arbiter.WORKERS[pid] = WorkerStub(pid, arbiter.scoreboard.acquire())
+        arbiter.num_workers = num_workers
+        self.addCleanup(arbiter.scoreboard.close)
+        return arbiter
+
+    def saturate(self, arbiter, active):
+        for worker in arbiter.WORKERS.values():
+            for _ in range(active):
+                worker.slot.start_request()
+
+    def test_autoscale_gevent(self):
+        arbiter = self.arbiter(2, WORKER_CLASS=Worker, MAX_WORKERS=4, AUTOSCALE_COOLDOWN=0,
+                               WORKER_CONNECTIONS=10)
+        self.saturate(arbiter, 1)
+        arbiter.autoscale_workers()
+        self.assertEqual(arbiter.num_workers, 1)
+
+    def test_autoscale_sync(self):
+        arbiter = self.arbiter(2, WORKER_CLASS=SyncWorker, MAX_WORKERS=4, AUTOSCALE_COOLDOWN=0)
+        self.saturate(arbiter, 1)
+        arbiter.autoscale_workers()
+        self.assertGreater(arbiter.num_workers, 2)
+
+    @unittest.skipIf(ThreadWorker is None, "futures isn't installed")
+    def test_autoscale_gthread(self):
+        arbiter = self.arbiter(2, WORKER_CLASS=ThreadWorker, MAX_WORKERS=4,
+                               AUTOSCALE_COOLDOWN=0, THREADS=4)
+        self.saturate(arbiter, 4)
+        arbiter.autoscale_workers()
+        self.assertGreater(arbiter.num_workers, 2)
+
+    def test_backoff_recovered(self):
+        arbiter = self.arbiter(2, CRASH_BACKOFF_MAX=60)
+        first, second = sorted(arbiter.WORKERS.values(), key=lambda w: w.age)
+        for worker in (first, second):
+            worker.slot.notify()
+            arbiter.backoff[worker.slot.index] = (3, 0)
+        first.boot_started -= 61
+        arbiter.manage_workers()
+        self.assertEqual(list(arbiter.backoff), [second.slot.index])
+
+        # the recovered slot is acquired like any other once freed
+        arbiter.scoreboard.release(first.slot)
+        slot = arbiter.scoreboard.acquire(exclude=arbiter.backoff)
+        self.assertEqual(slot.index, first.slot.index)
+
+    def test_spawns_pending(self):
+        arbiter = self.arbiter(2)
+        first, second = arbiter.WORKERS.values()
+        first.slot.notify()
+        arbiter.check_capacity(arbiter.scoreboard.snapshot([first.slot, second.slot]))
+        self.assertTrue(arbiter.spawns_pending)
+
+        # the missing worker is waiting on its backoff
+        del arbiter.WORKERS[second.age]
+        arbiter.scoreboard.release(second.slot)
+        arbiter.backoff[second.slot.index] = (1, time.time() + 60)
+        arbiter.check_capacity(arbiter.scoreboard.snapshot([first.slot]))
+        self.assertFalse(arbiter.spawns_pending)
+
+    @unittest.skipIf(mock is None, "mock isn't available")
+    def test_assign_cpus(self):
+        arbiter = self.arbiter(3, WORKER_CPU_AFFINITY='core')
+        workers = sorted(arbiter.WORKERS.values(), key=lambda w: w.age)
+        with mock.patch('tunicorn.util.get_cpu_affinity', return_value=set([0, 1, 2, 3])):
+            for worker in workers:
+                worker.cpus = arbiter.assign_cpus()
+            self.assertEqual([w.cpus for w in workers], [set([0]), set([1]), set([2])])
+            # the lowest cpu left by an exited worker, not the one of its slot
+            del arbiter.WORKERS[workers[1].age]
+            self.assertEqual(arbiter.assign_cpus(), set([1]))
+            arbiter.WORKERS[workers[1].age] = workers[1]
+            self.assertEqual(arbiter.assign_cpus(), set([3]))
+
+    def test_no_cpu_affinity(self):
+        self.assertIsNone(self.arbiter(1).assign_cpus())
+
+
+if __name__ == '__main__':
+    unittest.main()
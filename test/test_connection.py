@@ -0,0 +1,142 @@
+import socket
+import unittest
+
+from tunicorn.connection import BufferPool
+from tunicorn.connection import BufferedConnection
+from tunicorn.connection import IOV_MAX
+from tunicorn.exceptions import IncompleteReadError
+from tunicorn.exceptions import LimitOverrunError
+
+
+class BufferPoolTest(unittest.TestCase):
+    def test_reuse(self):
+        pool = BufferPool(16, count=1)
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertEqual(len(first), 16)
+        pool.release(first)
+        pool.release(second)
+        # at most count buffers are kept
+        self.assertIs(pool.acquire(), first)
+        self.assertIsNot(pool.acquire(), second)
+
+    def test_grown(self):
+        pool = BufferPool(16)
+        pool.release(bytearray(32))
+        self.assertEqual(pool.buffers, [])
+
+
+class BufferedConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        self.pool = BufferPool(8)
+        self.connection = BufferedConnection(self.server, self.pool)
+
+    def tearDown(self):
+        self.connection.close()
+        self.client.close()
+
+    def test_readexactly(self):
+        self.client.sendall(b'abc')
+        self.client.sendall(b'defgh')
+        self.assertEqual(self.connection.readexactly(4).tobytes(), b'abcd')
+        self.assertEqual(self.connection.readexactly(4).tobytes(), b'efgh')
+
+    def test_readexactly_incomplete(self):
+        self.client.sendall(b'abc')
+        self.client.shutdown(socket.SHUT_WR)
+        with self.assertRaises(IncompleteReadError) as cm:
+            self.connection.readexactly(4)
+        self.assertEqual(cm.exception.partial, b'abc')
+        self.assertEqual(cm.exception.expected, 4)
+
+    def test_read(self):
+        self.client.sendall(b'abcdef')
+        self.assertEqual(self.connection.read(2).tobytes(), b'ab')
+        self.assertEqual(self.connection.read().tobytes(), b'cdef')
+        self.client.close()
+        self.assertEqual(self.connection.read().tobytes(), b'')
+
+    def test_read_empty(self):
+        # nothing buffered, doesn't wait for the socket
+        self.assertEqual(self.connection.read(0).tobytes(), b'')
+
+    def test_peek(self):
+        self.client.sendall(b'abc')
+        self.assertEqual(self.connection.peek(2).tobytes(), b'abc')
+        self.assertEqual(self.connection.read(3).tobytes(), b'abc')
+
+    def test_readuntil(self):
+        self.client.sendall(b'ab\r')
+        self.client.sendall(b'\ncd\r\n')
+        self.assertEqual(self.connection.readuntil(b'\r\n').tobytes(), b'ab\r\n')
+        self.assertEqual(self.connection.readuntil(b'\r\n').tobytes(), b'cd\r\n')
+
+    def test_readuntil_limit(self):
+        self.client.sendall(b'x' * 9)
+        self.assertRaises(LimitOverrunError, self.connection.readuntil, b'\n')
+
+    def test_readuntil_incomplete(self):
+        self.client.sendall(b'abc')
+        self.client.shutdown(socket.SHUT_WR)
+        with self.assertRaises(IncompleteReadError) as cm:
+            self.connection.readuntil(b'\n')
+        self.assertEqual(cm.exception.partial, b'abc')
+
+    def test_readline(self):
+        self.client.sendall(b'ab\ncd')
+        self.client.shutdown(socket.SHUT_WR)
+        self.assertEqual(self.connection.readline().tobytes(), b'ab\n')
+        self.assertEqual(self.connection.readline().tobytes(), b'cd')
+
+    def test_growth(self):
+        # a frame longer than the buffer
+        self.client.sendall(b'abcd')
+        self.assertEqual(self.connection.readexactly(2).tobytes(), b'ab')
+        self.client.sendall(b'x' * 20)
+        view = self.connection.readexactly(22)
+        self.assertEqual(view.tobytes(), b'cd' + b'x' * 20)
+        self.assertEqual(len(self.connection.buf), 22)
+        # the pooled buffer goes back to the pool, not the grown one
+        self.connection.close()
+        self.assertEqual([len(b) for b in self.pool.buffers], [8])
+
+    def test_compaction(self):
+        self.client.sendall(b'abcdef')
+        self.assertEqual(self.connection.readexactly(4).tobytes(), b'abcd')
+        self.client.sendall(b'ghijkl')
+        # the buffered bytes are moved to the start of the buffer
+        self.assertEqual(self.connection.readexactly(6).tobytes(), b'efghij')
+        self.assertEqual(len(self.connection.buf), 8)
+
+    def test_writes(self):
+        self.connection.write(b'ab')
+        self.connection.writelines([bytearray(b'cd'), memoryview(b'ef')])
+        self.connection.flush()
+        self.assertEqual(self.connection.pending, [])
+        self.connection.write(b'gh')
+        self.connection.sendall(b'ij')
+        self.assertEqual(self.client.recv(16), b'abcdefghij')
+
+    def test_write_flushed(self):
+        # flushed once a buffer worth of bytes is queued
+        self.connection.write(b'abcd')
+        self.connection.writelines([b'efg', b'hi'])
+        self.assertEqual(self.connection.pending, [])
+        self.assertEqual(self.client.recv(16), b'abcdefghi')
+
+    def test_chunks_flushed(self):
+        self.connection.flush_size = 1 << 20
+        self.connection.writelines([b'x'] * (IOV_MAX + 10))
+        self.assertEqual(len(self.connection.pending), 10)
+        self.assertEqual(self.client.recv(IOV_MAX * 2), b'x' * IOV_MAX)
+
+    def test_close_flushes(self):
+        self.connection.write(b'bye')
+        self.connection.close()
+        self.assertEqual(self.client.recv(16), b'bye')
+        self.assertEqual(self.client.recv(16), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
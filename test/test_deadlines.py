@@ -0,0 +1,125 @@
+import socket
+import unittest
+
+from tunicorn.deadlines import DeadlineSocket
+from tunicorn.deadlines import TimeoutSocket
+from tunicorn.deadlines import TimerWheel
+from tunicorn.exceptions import DeadlineExpired
+
+
+class Conf(object):
+    IDLE_TIMEOUT = 0.05
+    READ_TIMEOUT = 0.05
+    WRITE_TIMEOUT = None
+
+
+class TimerWheelTest(unittest.TestCase):
+    def setUp(self):
+        self.wheel = TimerWheel(100.0, resolution=1.0, size=8)
+        self.fired = []
+
+    def schedule(self, expires):
+        return self.wheel.schedule(expires, lambda: self.fired.append(expires))
+
+    def test_expiry_order(self):
+        for expires in (103.5, 101.5, 102.5):
+            self.schedule(expires)
+        self.assertEqual(self.wheel.advance(101.9), 0)
+        self.assertEqual(self.wheel.advance(102.0), 1)
+        self.assertEqual(self.wheel.advance(104.0), 2)
+        self.assertEqual(self.fired, [101.5, 102.5, 103.5])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel(self):
+        deadline = self.schedule(101.5)
+        self.schedule(101.6)
+        self.wheel.cancel(deadline)
+        self.wheel.cancel(deadline)
+        self.wheel.advance(103.0)
+        self.assertEqual(self.fired, [101.6])
+
+    def test_passed(self):
+        # fired on the next tick
+        self.schedule(90.0)
+        self.wheel.advance(101.0)
+        self.assertEqual(self.fired, [90.0])
+
+    def test_next_turn(self):
+        # shares its bucket with 101.5 but expires a turn later
+        self.schedule(109.5)
+        self.schedule(101.5)
+        self.wheel.advance(102.0)
+        self.assertEqual(self.fired, [101.5])
+        self.wheel.advance(110.0)
+        self.assertEqual(self.fired, [101.5, 109.5])
+
+    def test_long_pause(self):
+        # more than a turn since the last advance
+        for expires in (101.5, 105.5, 130.0):
+            self.schedule(expires)
+        self.wheel.advance(120.0)
+        self.assertEqual(sorted(self.fired), [101.5, 105.5])
+        self.wheel.advance(131.0)
+        self.assertEqual(sorted(self.fired), [101.5, 105.5, 130.0])
+
+
+class DeadlineSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        self.expired = []
+        self.now = 100.0
+        self.wheel = TimerWheel(self.now)
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+
+    def test_expire(self):
+        sock = DeadlineSocket(self.server, self.wheel, Conf, lambda: self.now,
+                              self.expired.append)
+        self.client.sendall(b'ping')
+        self.assertEqual(sock.recv(4), b'ping')
+        self.assertEqual(len(self.wheel), 0)
+
+        # expires while the handler runs, the next call fails
+        sock._expire('read')
+        self.assertEqual(self.expired, ['read'])
+        self.assertRaises(DeadlineExpired, sock.recv, 4)
+
+
+class TimeoutSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        self.expired = []
+        self.sock = TimeoutSocket(self.server, Conf, self.expired.append)
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+
+    def test_idle(self):
+        self.assertRaises(DeadlineExpired, self.sock.recv, 4)
+        self.assertEqual(self.expired, ['idle'])
+        # the connection stays expired
+        self.client.sendall(b'ping')
+        self.assertRaises(DeadlineExpired, self.sock.recv, 4)
+
+    def test_read(self):
+        self.client.sendall(b'pi')
+        self.assertEqual(self.sock.recv(2), b'pi')
+        self.assertRaises(DeadlineExpired, self.sock.recv, 2)
+        self.assertEqual(self.expired, ['read'])
+
+    def test_write(self):
+        self.client.sendall(b'ping')
+        self.assertEqual(self.sock.recv(4), b'ping')
+        # no WRITE_TIMEOUT, blocking
+        self.sock.sendall(b'pong')
+        self.assertIsNone(self.server.gettimeout())
+        self.assertEqual(self.client.recv(4), b'pong')
+        self.assertRaises(DeadlineExpired, self.sock.recv, 4)
+        self.assertEqual(self.expired, ['idle'])
+
+
+if __name__ == '__main__':
+    unittest.main()
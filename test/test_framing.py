@@ -0,0 +1,203 @@
+import socket
+import struct
+import threading
+import unittest
+
+from tunicorn.exceptions import FramingError
+from tunicorn.framing import LengthPrefixedCodec
+from tunicorn.framing import LineCodec
+from tunicorn.framing import NetstringCodec
+from tunicorn.framing import RespCodec
+from tunicorn.framing import RespError
+from tunicorn.framing import RespSimpleString
+from tunicorn.framing import serve_frames
+
+
+def decode(codec, data):
+    buf = bytearray(data)
+    return codec.decode(buf, 0, len(buf))
+
+
+def encode(codec, payload):
+    return b''.join(memoryview(chunk).tobytes() for chunk in codec.encode(payload))
+
+
+def tobytes(value):
+    if isinstance(value, list):
+        return [tobytes(item) for item in value]
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return value
+
+
+class LengthPrefixedCodecTest(unittest.TestCase):
+    def test_decode(self):
+        codec = LengthPrefixedCodec()
+        data = struct.pack('!I', 3) + b'abcdef'
+        frame, size = decode(codec, data)
+        self.assertEqual((frame.tobytes(), size), (b'abc', 7))
+        self.assertIsNone(decode(codec, data[:3]))
+        self.assertIsNone(decode(codec, data[:6]))
+
+    def test_too_long(self):
+        codec = LengthPrefixedCodec('!H', max_size=4)
+        self.assertRaises(FramingError, decode, codec, struct.pack('!H', 5))
+
+    def test_encode(self):
+        self.assertEqual(encode(LengthPrefixedCodec('!H'), b'abc'), b'\x00\x03abc')
+
+
+class LineCodecTest(unittest.TestCase):
+    def test_decode(self):
+        codec = LineCodec(b'\r\n')
+        frame, size = decode(codec, b'abc\r\ndef')
+        self.assertEqual((frame.tobytes(), size), (b'abc', 5))
+        self.assertIsNone(decode(codec, b'abc\r'))
+
+    def test_too_long(self):
+        codec = LineCodec(max_size=4)
+        self.assertIsNone(decode(codec, b'abcd'))
+        self.assertRaises(FramingError, decode, codec, b'abcde')
+
+
+class NetstringCodecTest(unittest.TestCase):
+    def test_decode(self):
+        codec = NetstringCodec()
+        frame, size = decode(codec, b'3:abc,4:')
+        self.assertEqual((frame.tobytes(), size), (b'abc', 6))
+        frame, size = decode(codec, b'0:,')
+        self.assertEqual((frame.tobytes(), size), (b'', 3))
+
+    def test_partial(self):
+        codec = NetstringCodec()
+        for data in (b'', b'3', b'3:', b'3:abc'):
+            self.assertIsNone(decode(codec, data))
+
+    def test_invalid(self):
+        codec = NetstringCodec(max_size=100)
+        for data in (b':abc,', b'+3:abc,', b' 3:abc,', b'1_0:abc,', b'-1:abc,',
+                     b'101:', b'1000', b'3:abcd'):
+            self.assertRaises(FramingError, decode, codec, data)
+
+    def test_encode(self):
+        self.assertEqual(encode(NetstringCodec(), b'abc'), b'3:abc,')
+
+
+class RespCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.codec = RespCodec()
+
+    def test_decode(self):
+        data = b'*5\r\n$3\r\nSET\r\n+OK\r\n:-42\r\n$-1\r\n*1\r\n-ERR no\r\n'
+        value, size = decode(self.codec, data + b'*1')
+        self.assertEqual(size, len(data))
+        self.assertEqual(tobytes(value[:4]), [b'SET', b'OK', -42, None])
+        self.assertIsInstance(value[4][0], RespError)
+        self.assertEqual(value[4][0].message, b'ERR no')
+
+    def test_inline(self):
+        value, size = decode(self.codec, b'PING  hello\r\n')
+        self.assertEqual((tobytes(value), size), ([b'PING', b'hello'], 13))
+
+    def test_empty_array(self):
+        self.assertEqual(decode(self.codec, b'*0\r\n'), ([], 4))
+
+    def test_partial(self):
+        data = b'*2\r\n$3\r\nGET\r\n*2\r\n:1\r\n$5\r\nhello\r\n'
+        for end in range(len(data)):
+            self.assertIsNone(decode(self.codec, data[:end]))
+
+    def test_resume(self):
+        # the parse resumes where it stopped while the buffer is kept
+        data = b'*3\r\n$3\r\nGET\r\n*1\r\n:1\r\n$5\r\nhello\r\n'
+        buf = bytearray(data)
+        decode = self.codec.decoder()
+        for end in range(len(data)):
+            self.assertIsNone(decode(buf, 0, end))
+        value, size = decode(buf, 0, len(data))
+        self.assertEqual((tobytes(value), size), ([b'GET', [1], b'hello'], len(data)))
+
+    def test_resume_moved(self):
+        data = b'*2\r\n$3\r\nGET\r\n$3\r\nkey\r\n'
+        decode = self.codec.decoder()
+        self.assertIsNone(decode(bytearray(data), 0, 14))
+        # another buffer, parsed again from the start
+        buf = bytearray(b'xx' + data)
+        value, size = decode(buf, 2, len(buf))
+        self.assertEqual((tobytes(value), size), ([b'GET', b'key'], len(data)))
+
+    def test_invalid(self):
+        for data in (b':x\r\n', b'$-2\r\n', b'*x\r\n', b'$3\r\nabcd\r\n'):
+            self.assertRaises(FramingError, decode, self.codec, data)
+
+    def test_too_long(self):
+        codec = RespCodec(max_size=4)
+        self.assertRaises(FramingError, decode, codec, b'$5\r\n')
+        self.assertRaises(FramingError, decode, codec, b'+abcde')
+
+    def test_too_large(self):
+        codec = RespCodec(max_size=16)
+        # every line and bulk string is below max_size, the frame isn't
+        data = b'*16\r\n$1\r\nx\r\n'
+        self.assertIsNone(decode(codec, data))
+        self.assertRaises(FramingError, decode, codec, data + b'$1\r\n')
+        self.assertRaises(FramingError, decode, codec, data + b'$16\r\n')
+        self.assertRaises(FramingError, decode, codec, data + b'+abcde')
+        self.assertEqual(decode(codec, b'*1\r\n$6\r\nabcdef\r\n')[1], 16)
+
+    def test_array_length(self):
+        codec = RespCodec(max_length=2)
+        self.assertEqual(len(decode(codec, b'*2\r\n:1\r\n:2\r\n')[0]), 2)
+        self.assertRaises(FramingError, decode, codec, b'*3\r\n')
+
+    def test_depth(self):
+        codec = RespCodec(max_depth=3)
+        self.assertEqual(decode(codec, b'*1\r\n' * 3 + b':1\r\n')[0], [[[1]]])
+        self.assertRaises(FramingError, decode, codec, b'*1\r\n' * 4 + b':1\r\n')
+        # far deeper than the recursion limit
+        self.assertRaises(FramingError, decode, self.codec, b'*1\r\n' * 100000)
+
+    def test_encode(self):
+        payload = [b'abc', u'\xe9', RespSimpleString(b'OK'), 7, None, RespError('ERR')]
+        self.assertEqual(encode(self.codec, payload),
+                         b'*6\r\n$3\r\nabc\r\n$2\r\n\xc3\xa9\r\n+OK\r\n:7\r\n$-1\r\n-ERR\r\n')
+
+    def test_round_trip(self):
+        payload = [b'SET', [b'a', [1, None]], b'']
+        value, size = decode(self.codec, encode(self.codec, payload))
+        self.assertEqual(tobytes(value), payload)
+
+
+class ServeFramesTest(unittest.TestCase):
+    def test_pipelined(self):
+        server, client = socket.socketpair()
+        frames = []
+
+        def handle_frame(frame):
+            frames.append(tobytes(frame))
+            return frame[0].tobytes().lower()
+
+        thread = threading.Thread(target=serve_frames, args=(server, RespCodec(), handle_frame))
+        thread.start()
+        try:
+            client.sendall(b'*1\r\n$4\r\nPING\r\n*2\r\n$4\r\nE')
+            client.sendall(b'CHO\r\n$2\r\nhi\r\nQUIT\r\n')
+            client.shutdown(socket.SHUT_WR)
+            thread.join(5)
+            server.close()
+            data = b''
+            while True:
+                chunk = client.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            server.close()
+            client.close()
+
+        self.assertEqual(frames, [[b'PING'], [b'ECHO', b'hi'], [b'QUIT']])
+        self.assertEqual(data, b'$4\r\nping\r\n$4\r\necho\r\n$4\r\nquit\r\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
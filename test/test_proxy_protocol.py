@@ -0,0 +1,135 @@
+import socket
+import struct
+import unittest
+
+from tunicorn.exceptions import ProxyProtocolError
+from tunicorn.proxy_protocol import MAX_HEADER_SIZE
+from tunicorn.proxy_protocol import V1_MAX_SIZE
+from tunicorn.proxy_protocol import V2_HEADER
+from tunicorn.proxy_protocol import V2_SIGNATURE
+from tunicorn.proxy_protocol import parse_v1
+from tunicorn.proxy_protocol import parse_v2
+from tunicorn.proxy_protocol import read_proxy_header
+
+
+def v2_header(command=0x1, family=0x11, addresses=None, version=2):
+    if addresses is None:
+        addresses = struct.pack('!4s4sHH', socket.inet_aton('10.0.0.1'),
+                                socket.inet_aton('10.0.0.2'), 4242, 80)
+    return V2_HEADER.pack(V2_SIGNATURE, version << 4 | command, family,
+                          len(addresses)) + addresses
+
+
+class ParseV1Test(unittest.TestCase):
+    def test_tcp4(self):
+        data = b'PROXY TCP4 10.0.0.1 10.0.0.2 4242 80\r\nGET'
+        self.assertEqual(parse_v1(data), (len(data) - 3, ('10.0.0.1', 4242)))
+
+    def test_tcp6(self):
+        data = b'PROXY TCP6 2001:db8::1 2001:db8::2 4242 80\r\n'
+        self.assertEqual(parse_v1(data), (len(data), ('2001:db8::1', 4242)))
+
+    def test_unknown(self):
+        data = b'PROXY UNKNOWN ffff::1 ffff::2 1 2\r\n'
+        self.assertEqual(parse_v1(data), (len(data), None))
+
+    def test_partial(self):
+        self.assertRaises(ProxyProtocolError, parse_v1, b'PROXY TCP4 10.0.0.1')
+
+    def test_too_long(self):
+        self.assertRaises(ProxyProtocolError, parse_v1, b'PROXY ' + b'x' * V1_MAX_SIZE + b'\r\n')
+
+    def test_invalid(self):
+        for data in (b'PROXY TCP5 10.0.0.1 10.0.0.2 4242 80\r\n',
+                     b'PROXY TCP4 10.0.0.1 10.0.0.2 4242\r\n',
+                     b'PROXY TCP4 10.0.0.300 10.0.0.2 4242 80\r\n',
+                     b'PROXY TCP4 2001:db8::1 10.0.0.2 4242 80\r\n',
+                     b'PROXY TCP4 10.0.0.1 10.0.0.2 port 80\r\n',
+                     b'PROXY TCP4 10.0.0.1 10.0.0.2 65536 80\r\n'):
+            self.assertRaises(ProxyProtocolError, parse_v1, data)
+
+
+class ParseV2Test(unittest.TestCase):
+    def test_proxy_ipv4(self):
+        data = v2_header()
+        self.assertEqual(parse_v2(data + b'GET'), (len(data), ('10.0.0.1', 4242)))
+
+    def test_proxy_ipv6(self):
+        addresses = struct.pack('!16s16sHH', socket.inet_pton(socket.AF_INET6, '2001:db8::1'),
+                                socket.inet_pton(socket.AF_INET6, '2001:db8::2'), 4242, 80)
+        data = v2_header(family=0x21, addresses=addresses)
+        self.assertEqual(parse_v2(data), (len(data), ('2001:db8::1', 4242)))
+
+    def test_tlvs(self):
+        # the TLVs following the addresses are skipped
+        data = v2_header(addresses=v2_header()[V2_HEADER.size:] + b'\x04\x00\x01x')
+        self.assertEqual(parse_v2(data), (len(data), ('10.0.0.1', 4242)))
+
+    def test_local(self):
+        data = v2_header(command=0x0, family=0x0, addresses=b'')
+        self.assertEqual(parse_v2(data), (len(data), None))
+
+    def test_unix(self):
+        data = v2_header(family=0x31, addresses=b'\0' * 216)
+        self.assertEqual(parse_v2(data), (len(data), None))
+
+    def test_partial(self):
+        data = v2_header()
+        self.assertRaises(ProxyProtocolError, parse_v2, data[:V2_HEADER.size - 1])
+        self.assertRaises(ProxyProtocolError, parse_v2, data[:-1])
+
+    def test_invalid(self):
+        self.assertRaises(ProxyProtocolError, parse_v2, v2_header(version=1))
+        self.assertRaises(ProxyProtocolError, parse_v2, v2_header(command=0x2))
+        self.assertRaises(ProxyProtocolError, parse_v2, v2_header(addresses=b'\0' * 4))
+
+    def test_too_long(self):
+        self.assertRaises(ProxyProtocolError, parse_v2,
+                          v2_header(addresses=b'\0' * MAX_HEADER_SIZE))
+
+
+class ReadProxyHeaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+
+    def test_v1(self):
+        self.client.sendall(b'PROXY TCP4 10.0.0.1 10.0.0.2 4242 80\r\nGET /')
+        self.assertEqual(read_proxy_header(self.server, 1.0), ('10.0.0.1', 4242))
+        # the data following the header is left to the handler
+        self.assertEqual(self.server.recv(16), b'GET /')
+
+    def test_v2(self):
+        self.client.sendall(v2_header() + b'GET /')
+        self.assertEqual(read_proxy_header(self.server, 1.0), ('10.0.0.1', 4242))
+        self.assertEqual(self.server.recv(16), b'GET /')
+
+    def test_timeout_restored(self):
+        self.server.settimeout(5.0)
+        self.client.sendall(b'PROXY UNKNOWN\r\n')
+        self.assertIsNone(read_proxy_header(self.server, 1.0))
+        self.assertEqual(self.server.gettimeout(), 5.0)
+
+    def test_no_header(self):
+        self.assertRaises(ProxyProtocolError, read_proxy_header, self.server, 0.05)
+
+    def test_missing(self):
+        self.client.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        self.assertRaises(ProxyProtocolError, read_proxy_header, self.server, 1.0)
+
+    def test_partial(self):
+        self.client.sendall(b'PROX')
+        self.assertRaises(ProxyProtocolError, read_proxy_header, self.server, 1.0)
+        self.client.sendall(b'Y TCP4 10.0.0.1')
+        self.assertRaises(ProxyProtocolError, read_proxy_header, self.server, 1.0)
+
+    def test_closed(self):
+        self.client.close()
+        self.assertRaises(ProxyProtocolError, read_proxy_header, self.server, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
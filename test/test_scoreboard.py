@@ -0,0 +1,86 @@
+import unittest
+
+from tunicorn.workers.scoreboard import STATE_BOOTING
+from tunicorn.workers.scoreboard import STATE_BUSY
+from tunicorn.workers.scoreboard import STATE_EXITING
+from tunicorn.workers.scoreboard import STATE_IDLE
+from tunicorn.workers.scoreboard import SLOT_FORMAT
+from tunicorn.workers.scoreboard import SLOT_SIZE
+from tunicorn.workers.scoreboard import Scoreboard
+
+
+class ScoreboardTest(unittest.TestCase):
+    def setUp(self):
+        self.scoreboard = Scoreboard(3)
+
+    def tearDown(self):
+        self.scoreboard.close()
+
+    def test_slot_fits(self):
+        self.assertLessEqual(SLOT_FORMAT.size, SLOT_SIZE)
+
+    def test_acquire_all(self):
+        slots = [self.scoreboard.acquire() for _ in range(3)]
+        self.assertEqual(sorted(s.index for s in slots), [0, 1, 2])
+        self.assertIsNone(self.scoreboard.acquire())
+
+    def test_acquire_index(self):
+        slot = self.scoreboard.acquire(2)
+        self.assertEqual(slot.index, 2)
+        # taken, another free slot is returned instead
+        self.assertNotEqual(self.scoreboard.acquire(2).index, 2)
+
+    def test_release(self):
+        slots = [self.scoreboard.acquire() for _ in range(3)]
+        slots[1].pid = 42
+        slots[1].write()
+        self.scoreboard.release(slots[1])
+        slot = self.scoreboard.acquire()
+        self.assertEqual(slot.index, 1)
+        self.assertEqual(slot.read().pid, 0)
+
+    def test_acquire_exclude(self):
+        slots = [self.scoreboard.acquire() for _ in range(3)]
+        self.scoreboard.release(slots[0])
+        self.scoreboard.release(slots[2])
+        # the last released slot is backing off
+        self.assertEqual(self.scoreboard.acquire(exclude={2: None}).index, 0)
+        self.assertIsNone(self.scoreboard.acquire(exclude=[2]))
+        self.assertEqual(self.scoreboard.acquire(2, exclude=[2]).index, 2)
+
+    def test_snapshot(self):
+        first = self.scoreboard.acquire()
+        second = self.scoreboard.acquire()
+        first.pid = 10
+        first.notify()
+        second.pid = 11
+        second.start_request()
+        second.start_request()
+        second.finish_request()
+
+        snapshot = self.scoreboard.snapshot([first, second])
+        self.assertEqual(snapshot[first.index].pid, 10)
+        self.assertEqual(snapshot[first.index].state, STATE_IDLE)
+        self.assertEqual(snapshot[second.index].state, STATE_BUSY)
+        self.assertEqual(snapshot[second.index].active, 1)
+        self.assertEqual(snapshot[second.index].requests, 1)
+
+    def test_slot_lifecycle(self):
+        slot = self.scoreboard.acquire()
+        self.assertEqual(slot.read().state, STATE_BOOTING)
+        slot.start_request()
+        slot.finish_request()
+        record = slot.read()
+        self.assertEqual(record.state, STATE_IDLE)
+        self.assertEqual(record.request_started, 0)
+        slot.request_recycle()
+        slot.saturate()
+        slot.count_timeout()
+        slot.close()
+        record = slot.read()
+        self.assertEqual((record.recycle, record.saturations, record.timeouts), (1, 1, 1))
+        self.assertEqual(record.state, STATE_EXITING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import sys
+import types
+import unittest
+
+from tunicorn.util import unload_app
+
+
+class UnloadAppTest(unittest.TestCase):
+    def test_unload_app(self):
+        names = ['tunitest', 'tunitest.app', 'tunitest.app.views', 'tunitest.apps', 'tunitest.db']
+        for name in names:
+            sys.modules[name] = types.ModuleType(name)
+        self.addCleanup(lambda: [sys.modules.pop(name, None) for name in names])
+
+        unload_app('tunitest.app:application')
+        # the package and its other modules are kept
+        self.assertEqual(sorted(n for n in sys.modules if n.startswith('tunitest')),
+                         ['tunitest', 'tunitest.apps', 'tunitest.db'])
+
+
+if __name__ == '__main__':
+    unittest.main()
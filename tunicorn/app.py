@@ -1,14 +1,22 @@
+import gc
 import logging
 import os
 import sys
 from argparse import ArgumentParser
 
+from six import string_types
+
 from tunicorn.arbiter import Arbiter
 from tunicorn.config import Config
 from tunicorn.workers import choose_worker
+from .sock import SOCKET_SETTINGS
+from .sock import check_socket_settings
+from .sock import create_ssl_context
+from .util import check_cpu_affinity
 from .util import daemonize
 from .util import import_app
 from .util import parse_address
+from .util import unload_app
 
 DEFAULT_CONFIG = {
     'NAME': 'TUNICORN',
@@ -18,21 +26,74 @@ DEFAULT_CONFIG = {
     "ENV": None,
     "UMASK": 0,
     "BACKLOG": 2048,
+    "BACKLOG_LOG_INTERVAL": 10,
+    "CERTFILE": None,
+    "KEYFILE": None,
+    "SSL_CIPHERS": None,
+    "SSL_ALPN_PROTOCOLS": None,
+    "SSL_TICKET_KEY_LIFETIME": 86400,
+    "PROXY_PROTOCOL": False,
+    "PROXY_PROTOCOL_TIMEOUT": 3,
+    "REUSE_PORT": False,
+    "REUSE_PORT_CBPF": False,
+    "SO_RCVBUF": None,
+    "SO_SNDBUF": None,
+    "SO_KEEPALIVE": False,
+    "TCP_KEEPIDLE": None,
+    "TCP_KEEPINTVL": None,
+    "TCP_KEEPCNT": None,
+    "TCP_USER_TIMEOUT": None,
+    "TCP_DEFER_ACCEPT": None,
+    "TCP_FASTOPEN": None,
     "GRACEFUL_TIMEOUT": 5,
+    "RELOAD_BATCH_SIZE": 1,
+    "PRELOAD_APP": False,
+    "PARALLEL_BOOT": False,
+    "WORKER_CPU_AFFINITY": None,
+    "CONTROL_SOCKET": None,
+    "CRASH_BACKOFF_BASE": 1,
+    "CRASH_BACKOFF_MAX": 60,
+    "SPAWN_RATE_LIMIT": 10,
+    "SCOREBOARD_SIZE": 1024,
+    "MIN_WORKERS": 1,
+    "MAX_WORKERS": None,
+    "AUTOSCALE_UP_THRESHOLD": 0.75,
+    "AUTOSCALE_DOWN_THRESHOLD": 0.25,
+    "AUTOSCALE_COOLDOWN": 30,
+    "MAX_REQUESTS": 0,
+    "MAX_REQUESTS_JITTER": 0,
+    "MAX_WORKER_RSS": 0,
+    "MEMORY_CHECK_INTERVAL": 10,
+    "MEMORY_LOG_INTERVAL": 60,
     "WORKER_CONNECTIONS": 1000,
+    "RESERVED_CONNECTIONS": 0,
+    "IDLE_TIMEOUT": None,
+    "READ_TIMEOUT": None,
+    "WRITE_TIMEOUT": None,
+    "BUFFERED_CONNECTION": False,
+    "BUFFER_SIZE": 65536,
+    "THREADS": 4,
     "TIMEOUT": 30,
     "CHDIR": os.getcwd(),
     'DAEMON': False,
     'ENABLE_STDIO_INHERITANCE': False
 }
 
+# settings a BIND entry can override for its listener
+LISTENER_SETTINGS = ('APP', 'WORKER_CONNECTIONS', 'RESERVED_CONNECTIONS', 'REUSE_PORT_CBPF',
+                     'CERTFILE', 'KEYFILE', 'SSL_CIPHERS', 'SSL_ALPN_PROTOCOLS', 'PROXY_PROTOCOL',
+                     'PROXY_PROTOCOL_TIMEOUT', 'IDLE_TIMEOUT', 'READ_TIMEOUT',
+                     'WRITE_TIMEOUT', 'BUFFERED_CONNECTION') + SOCKET_SETTINGS
+
 
 class Application(object):
     def __init__(self, usage=None, prog=None):
         self.usage = usage
+        self.cwd = os.getcwd()
         self.config = None
         self.app_module = None
-        self.callable = None
+        self.args = None
+        self.callables = {}
         self.prog = prog or 'Tunicorn'
         self.logger = logging.getLogger('app')
         ch = logging.StreamHandler()
@@ -54,6 +115,7 @@ class Application(object):
 
         args = parser.parse_args()
 
+        self.args = args
         self.config = Config(os.getcwd(), defaults=DEFAULT_CONFIG)
         self.config.from_pyfile(args.filename)
         self.init_config(args)
@@ -67,30 +129,122 @@ class Application(object):
             pass
         self.config.WORKER_CLASS = worker_class
 
-        self.config.ADDRESS = [parse_address(self.config.BIND)]
-
         if self.config.UID is None:
             self.config.UID = os.getuid()
 
         if self.config.GID is None:
             self.config.GID = os.getgid()
 
+        check_cpu_affinity(self.config.WORKER_CPU_AFFINITY)
+
+        # the listeners inherit the settings above
+        self.config.LISTENERS = self.listener_configs(self.config.BIND)
+        self.config.ADDRESS = [conf.ADDRESS for conf in self.config.LISTENERS]
+        # built by listener_conf for the inherited sockets without an
+        # entry in BIND, the listeners have their own
+        self.config.SSL_CONTEXT = None
+
+    def listener_configs(self, bind):
+        """Build the configuration of every listener from ``BIND``, either
+        an address or a list of entries. An entry is an address or a dict
+        with the address in ``bind`` and the settings of the listener::
+
+            BIND = [
+                "0.0.0.0:8080",
+                {"bind": "unix:/run/admin.sock", "app": "admin:app",
+                 "worker_connections": 10}
+            ]
+
+        The settings are those of :data:`LISTENER_SETTINGS`, the others
+        are inherited from the configuration.
+        """
+        if isinstance(bind, (string_types, dict)):
+            bind = [bind]
+
+        listeners = []
+        for entry in bind:
+            if isinstance(entry, string_types):
+                entry = {'bind': entry}
+            conf = Config(self.config.root_path, defaults=self.config)
+            conf.APP = self.app_module
+            for key, value in entry.items():
+                if key == 'bind':
+                    continue
+                if key.upper() not in LISTENER_SETTINGS:
+                    raise RuntimeError("Unknown listener setting %r in BIND" % key)
+                conf[key.upper()] = value
+            conf.ADDRESS = parse_address(entry['bind'])
+            check_socket_settings(conf)
+            conf.SSL_CONTEXT = create_ssl_context(conf)
+            listeners.append(conf)
+        return listeners
+
+    @property
+    def app_modules(self):
+        modules = [self.app_module]
+        for conf in self.config.LISTENERS:
+            if conf.APP not in modules:
+                modules.append(conf.APP)
+        return modules
+
     def chdir(self):
         os.chdir(self.config.CHDIR)
-        sys.path.insert(0, self.config.CHDIR)
+        if self.config.CHDIR not in sys.path:
+            sys.path.insert(0, self.config.CHDIR)
 
-    def load(self):
+    def load(self, module=None):
         self.chdir()
-        return import_app(self.app_module)
+        return import_app(module or self.app_module)
+
+    def load_all(self):
+        self.callables = dict((module, self.load(module)) for module in self.app_modules)
+
+    def unload_all(self):
+        for module in self.app_modules:
+            unload_app(module)
+        self.callables = {}
+
+    def reload(self):
+        """Re-read the configuration file and re-import the application,
+        the current configuration is restored if anything fails.
+
+        """
+        config = self.config
+        callables = self.callables
+        try:
+            self.config = Config(self.cwd, defaults=DEFAULT_CONFIG)
+            self.config.from_pyfile(self.args.filename)
+            self.init_config(self.args)
+            self.unload_all()
+            self.load_all()
+        except:
+            self.config = config
+            self.callables = callables
+            raise
+        if not self.config.PRELOAD_APP:
+            self.unload_all()
 
     @property
     def handler(self):
-        if self.callable is None:
-            self.callable = self.load()
-        return self.callable
+        return self.get_handler(self.app_module)
+
+    def get_handler(self, module=None):
+        module = module or self.app_module
+        if module not in self.callables:
+            self.callables[module] = self.load(module)
+        return self.callables[module]
 
     def run(self):
-        self.load()
+        if self.config.PRELOAD_APP:
+            self.load_all()
+            # collect the garbage of the import once, the remaining objects
+            # are frozen before each fork, see Arbiter.spawn_worker
+            gc.collect()
+        else:
+            # make sure the application can be imported, each worker
+            # imports it again on its own
+            self.load_all()
+            self.unload_all()
         if self.config.DAEMON:
             daemonize(self.config.ENABLE_STDIO_INHERITANCE)
         try:
@@ -101,4 +255,7 @@ class Application(object):
 
 
 def run():
+    if sys.argv[1:2] == ['ctl']:
+        from .control import run_ctl
+        sys.exit(run_ctl(sys.argv[2:]))
     Application('%(prog)s [OPTIONS] [APP_MODULE]').run()
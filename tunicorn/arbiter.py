@@ -1,4 +1,7 @@
 import errno
+import gc
+import logging
+import math
 import os
 import random
 import select
@@ -8,10 +11,23 @@ import time
 import traceback
 
 from tunicorn import __version__
+from .control import ControlServer
 from .exceptions import AppImportException
 from .exceptions import HaltServerException
 from .signaler import Signaler
+from .sock import SD_LISTEN_FDS_START
 from .sock import create_sockets
+from .sock import create_ssl_context
+from .sock import listen_fds
+from .sock import listener_conf
+from .sock import listener_settings
+from .util import cpu_sets
+from .util import listen_queues
+from .util import somaxconn
+from .util import tcp_ext_stats
+from .workers.scoreboard import STATE_BUSY
+from .workers.scoreboard import STATE_IDLE
+from .workers.scoreboard import Scoreboard
 
 
 class Arbiter(Signaler):
@@ -31,6 +47,7 @@ class Arbiter(Signaler):
         self.num_workers = self.app.config.WORKERS
         # TODO(benjamin): process logger
         self.timeout = self.app.config.TIMEOUT
+        self.graceful_timeout = self.app.config.GRACEFUL_TIMEOUT
         self.logger = self.app.logger
 
         self.master_name = "Master"
@@ -41,11 +58,40 @@ class Arbiter(Signaler):
         self.worker_age = 0
         self.master_pid = 0
         self.reexec_pid = 0
+        self.reload_age = 0
+        self.systemd = False
         self.pid = None
+        self.scoreboard = None
+        self.control = None
+        self.busy_ratio = None
+        self.last_scaled = 0
+        self.memory_logged = 0
+        self.backlog_logged = 0
+        self.ssl_rotated = 0
+        self.tcp_stats = None
+        self.worker_counters = {}
+        self.capacity_lost = None
+        # workers booting or to be spawned, not waiting on their backoff
+        self.spawns_pending = False
+        self.ever_booted = False
+        self.boot_failures = 0
+        self.degraded = False
+        self.spawn_tokens = 0
+        self.spawn_refilled = 0
+
+        # slot index -> (consecutive failures, respawn not before)
+        self.backoff = {}
 
         self.WORKERS = {}
         self.LISTENERS = []
 
+        # context used to re-execute the master on SIGUSR2
+        self.START_CTX = {
+            'args': [sys.executable] + sys.argv,
+            'cwd': self.app.cwd,
+            0: sys.executable
+        }
+
     def handle_cld(self):
         self.reap_workers()
         self.wake_up()
@@ -113,25 +159,46 @@ class Arbiter(Signaler):
 
     def handle_winch(self):
         """SIGWINCH handling
+        Gracefully stop the workers of a daemonized master, this is
+        used to retire the old worker set after a SIGUSR2 upgrade.
 
-        :return:
         """
-        # TODO(benjamin): daemon process
+        if self.app.config.DAEMON:
+            self.drain()
+        else:
+            self.logger.debug("SIGWINCH ignored. Not daemonized")
 
     # --------------------------------------------------
     # workers methods
     # --------------------------------------------------
     def manage_workers(self):
-        if len(self.WORKERS.keys()) < self.num_workers:
-            self.spawn_workers()
-
-        workers = self.WORKERS.items()
-        workers = sorted(workers, key=lambda w: w[1].age)
-        while len(workers) > self.num_workers:
-            pid, _ = workers.pop(0)
-            self.kill_worker(pid, signal.SIGTERM)
+        workers = [w for w in self.WORKERS.values() if not w.retired]
+        slots = self.scoreboard.snapshot([w.slot for w in workers])
+        if any(s.state in (STATE_IDLE, STATE_BUSY) for s in slots.values()):
+            self.ever_booted = True
+            self.boot_failures = 0
+        if self.backoff:
+            self.forget_backoff(workers, slots)
+
+        if self.reload_age or any(slots[w.slot.index].recycle for w in workers):
+            self.replace_workers(slots)
+            active_worker_count = len(self.WORKERS)
+        else:
+            if len(self.WORKERS.keys()) < self.num_workers:
+                self.spawn_workers()
+
+            workers = self.WORKERS.items()
+            workers = sorted(workers, key=lambda w: w[1].age)
+            while len(workers) > self.num_workers:
+                pid, worker = workers.pop(0)
+                # not a crash, the slot doesn't back off
+                worker.retired = True
+                self.kill_worker(pid, signal.SIGTERM)
+
+            active_worker_count = len(workers)
+
+        self.check_capacity(slots)
 
-        active_worker_count = len(workers)
         if self._last_active_count != active_worker_count:
             self._last_active_count = active_worker_count
             self.logger.debug('{0} workers'.format(active_worker_count),
@@ -139,22 +206,383 @@ class Arbiter(Signaler):
                                      "value": active_worker_count,
                                      "mtype": "gauge"})
 
+    def forget_backoff(self, workers, slots):
+        """Forget the failures of the slots whose booted worker has lived
+        longer than ``CRASH_BACKOFF_MAX``, the slot is then allocated like
+        any other one again.
+
+        """
+        now = time.time()
+        for worker in workers:
+            index = worker.slot.index
+            if (index in self.backoff and slots[index].state in (STATE_IDLE, STATE_BUSY) and
+                    now - worker.boot_started > self.app.config.CRASH_BACKOFF_MAX):
+                del self.backoff[index]
+                self.logger.info("Slot %s recovered", index)
+
+    def check_capacity(self, slots):
+        """Report the time it took to get back to ``num_workers`` booted
+        workers, after the startup or after workers were lost.
+
+        """
+        ready = len([s for s in slots.values() if s.state in (STATE_IDLE, STATE_BUSY)])
+        self.spawns_pending = False
+        if ready < self.num_workers:
+            if self.capacity_lost is None:
+                self.capacity_lost = time.time()
+            waiting, _ = self.backoff_slots()
+            self.spawns_pending = ready + len(waiting) < self.num_workers
+        elif self.capacity_lost is not None:
+            elapsed = time.time() - self.capacity_lost
+            self.capacity_lost = None
+            if self.degraded:
+                self.degraded = False
+                self.logger.info("Leaving degraded mode")
+            self.logger.info("Full capacity of %s workers reached in %.3fs", ready, elapsed,
+                             extra={"metric": "tunicorn.capacity_time",
+                                    "value": elapsed,
+                                    "mtype": "histogram"})
+
+    def autoscale_workers(self):
+        """Adjust the number of workers to their utilization
+        The busy ratio is the number of active connections against the
+        capacity of the booted workers, ``WORKER_CONNECTIONS`` or one per
+        thread, see :meth:`Worker.capacity`, smoothed over the arbiter
+        ticks. Workers are added above ``AUTOSCALE_UP_THRESHOLD`` and retired
+        one by one below ``AUTOSCALE_DOWN_THRESHOLD``, at most once every
+        ``AUTOSCALE_COOLDOWN`` seconds and within ``MIN_WORKERS`` and
+        ``MAX_WORKERS``. Autoscaling is disabled unless ``MAX_WORKERS`` is set.
+
+        """
+        config = self.app.config
+        # nothing to scale while reloading or once drained
+        if config.MAX_WORKERS is None or self.reload_age or not self.num_workers:
+            return
+
+        min_workers = max(config.MIN_WORKERS or 1, 1)
+        max_workers = max(config.MAX_WORKERS, min_workers)
+        self.num_workers = max(min(self.num_workers, max_workers), min_workers)
+
+        slots = self.scoreboard.snapshot([w.slot for w in self.WORKERS.values() if not w.retired])
+        booted = [s for s in slots.values() if s.state in (STATE_IDLE, STATE_BUSY)]
+        if not booted:
+            return
+
+        capacity = self.worker_class.capacity(config)
+        ratio = sum(s.active for s in booted) / float(len(booted) * capacity)
+        if self.busy_ratio is None:
+            self.busy_ratio = ratio
+        else:
+            self.busy_ratio = 0.7 * self.busy_ratio + 0.3 * ratio
+
+        now = time.time()
+        if now - self.last_scaled < config.AUTOSCALE_COOLDOWN:
+            return
+
+        num_workers = self.num_workers
+        if self.busy_ratio > config.AUTOSCALE_UP_THRESHOLD:
+            wanted = int(math.ceil(len(booted) * self.busy_ratio / config.AUTOSCALE_UP_THRESHOLD))
+            num_workers = max(wanted, num_workers + 1)
+        elif self.busy_ratio < config.AUTOSCALE_DOWN_THRESHOLD:
+            num_workers -= 1
+        num_workers = max(min(num_workers, max_workers), min_workers)
+
+        if num_workers == self.num_workers:
+            return
+
+        self.logger.info("Autoscaling from %s to %s workers (busy ratio: %.2f)",
+                         self.num_workers, num_workers, self.busy_ratio,
+                         extra={"metric": "tunicorn.busy_ratio",
+                                "value": self.busy_ratio,
+                                "mtype": "gauge"})
+        self.num_workers = num_workers
+        self.last_scaled = now
+
+    def log_workers_memory(self):
+        """Log and export the memory usage published by every worker
+        once every ``MEMORY_LOG_INTERVAL`` seconds.
+
+        """
+        interval = self.app.config.MEMORY_LOG_INTERVAL
+        now = time.time()
+        if not interval or now - self.memory_logged < interval:
+            return
+        self.memory_logged = now
+
+        workers = sorted(self.WORKERS.items(), key=lambda w: w[1].age)
+        slots = self.scoreboard.snapshot([worker.slot for _, worker in workers])
+        for pid, worker in workers:
+            slot = slots[worker.slot.index]
+            if not slot.rss:
+                continue
+            self.logger.debug("Worker %s (age: %s) rss: %s, uss: %s, requests: %s",
+                              pid, worker.age, slot.rss, slot.uss, slot.requests,
+                              extra={"metric": "tunicorn.worker.%s.rss" % worker.slot.index,
+                                     "value": slot.rss,
+                                     "mtype": "gauge"})
+
+    def rotate_ssl_contexts(self):
+        """Build new TLS contexts, with new session ticket keys, once every
+        ``SSL_TICKET_KEY_LIFETIME`` seconds. The workers aren't replaced
+        for it: the ones spawned from then on fork with the new keys, the
+        running ones keep theirs until they are replaced anyway, e.g. by
+        ``MAX_REQUESTS`` or a reload. A ticket only resumes on the workers
+        sharing its key, the other ones do a full handshake.
+
+        """
+        config = self.app.config
+        lifetime = config.SSL_TICKET_KEY_LIFETIME
+        now = time.time()
+        if not lifetime or now - self.ssl_rotated < lifetime:
+            return
+        self.ssl_rotated = now
+
+        confs = [conf for conf in [config] + config.LISTENERS if conf.SSL_CONTEXT is not None]
+        if not confs:
+            return
+
+        try:
+            contexts = [create_ssl_context(conf) for conf in confs]
+        except Exception:
+            self.logger.exception("Unable to rotate the TLS session ticket keys")
+            return
+
+        for conf, context in zip(confs, contexts):
+            conf.SSL_CONTEXT = context
+        self.logger.info("Rotating the TLS session ticket keys of the new workers")
+
+    def log_listeners_backlog(self):
+        """Log and export the accept queue of every TCP listener and the
+        ``ListenOverflows``/``ListenDrops`` counters of the host once every
+        ``BACKLOG_LOG_INTERVAL`` seconds. The queue of a listener is the
+        sum of the queues of the sockets bound to its address, e.g. the
+        ones of the workers with ``REUSE_PORT``.
+        The times the workers stopped accepting because they had
+        ``WORKER_CONNECTIONS`` connections and the connections closed by
+        their deadlines are counted along.
+
+        """
+        interval = self.app.config.BACKLOG_LOG_INTERVAL
+        now = time.time()
+        if not interval or now - self.backlog_logged < interval:
+            return
+        self.backlog_logged = now
+
+        queues = listen_queues()
+        limit = somaxconn()
+        for l in self.LISTENERS:
+            address = l.getsockname()
+            if not isinstance(address, tuple):
+                continue
+            address = address[:2]
+            sockets = [queued for addr, queued in queues if addr == address]
+            if not sockets:
+                continue
+            queued = sum(sockets)
+            backlog = len(sockets) * min(l.conf.BACKLOG, limit or l.conf.BACKLOG)
+            name = "%s:%s" % address
+            self.logger.debug("Listener %s accept queue: %s/%s", name, queued, backlog,
+                              extra={"metric": "tunicorn.listener.%s.accept_queue" % name,
+                                     "value": queued,
+                                     "mtype": "gauge"})
+            if queued >= backlog:
+                self.logger.warning("Listener %s accept queue is full (%s), connections "
+                                    "are dropped by the kernel", name, backlog)
+
+        # the connections a saturated worker didn't accept went to the
+        # other workers or waited in the accept queue, the ones closed by
+        # their deadlines gave their slot back
+        workers = list(self.WORKERS.items())
+        slots = self.scoreboard.snapshot([worker.slot for _, worker in workers])
+        for counter, name in (('saturations', 'Worker saturations'),
+                              ('timeouts', 'Connection timeouts')):
+            counts = dict((pid, getattr(slots[worker.slot.index], counter)) for pid, worker in workers)
+            previous = self.worker_counters.get(counter, {})
+            delta = sum(count - previous.get(pid, 0) for pid, count in counts.items())
+            self.worker_counters[counter] = counts
+            self.logger.log(logging.WARNING if delta else logging.DEBUG,
+                            "%s: %s in the last %ss", name, delta, interval,
+                            extra={"metric": "tunicorn.worker.%s" % counter,
+                                   "value": delta,
+                                   "mtype": "counter"})
+
+        stats = tcp_ext_stats()
+        previous, self.tcp_stats = self.tcp_stats, stats
+        if previous is None:
+            return
+        for counter in ('ListenOverflows', 'ListenDrops'):
+            if counter not in stats:
+                continue
+            delta = stats[counter] - previous.get(counter, 0)
+            self.logger.log(logging.WARNING if delta else logging.DEBUG,
+                            "%s: %s in the last %ss", counter, delta, interval,
+                            extra={"metric": "tunicorn.tcp.%s" % counter,
+                                   "value": delta,
+                                   "mtype": "counter"})
+
+    def check_backlog(self):
+        """Warn about the listeners whose ``BACKLOG`` is capped by
+        ``net.core.somaxconn``."""
+        limit = somaxconn()
+        if limit is None:
+            return
+        for l in self.LISTENERS:
+            if l.conf.BACKLOG > limit:
+                self.logger.warning("BACKLOG %s of %s is capped to net.core.somaxconn %s",
+                                    l.conf.BACKLOG, l, limit)
+
+    def replace_workers(self, slots):
+        """Rolling replacement of the workers spawned before the last reload
+        or asking to be recycled. At most ``RELOAD_BATCH_SIZE`` new workers
+        are booting at the same time and an old worker only gets SIGTERM once
+        a new one has booted, so the number of booted workers never drops
+        below ``num_workers``.
+
+        """
+        old, ready, booting = [], 0, 0
+        for pid, worker in sorted(self.WORKERS.items(), key=lambda w: w[1].age):
+            if worker.retired:
+                continue
+            slot = slots[worker.slot.index]
+            if worker.age <= self.reload_age or slot.recycle:
+                old.append(pid)
+            elif slot.state in (STATE_IDLE, STATE_BUSY):
+                ready += 1
+            else:
+                booting += 1
+
+        while old and len(old) + ready > self.num_workers:
+            pid = old.pop(0)
+            self.WORKERS[pid].retired = True
+            self.kill_worker(pid, signal.SIGTERM)
+
+        if not old:
+            if self.reload_age:
+                self.logger.info("Reload complete, %s workers replaced", ready)
+            self.reload_age = 0
+            return
+
+        # the replacement pauses while crashed workers are backing off
+        waiting, expired = self.backoff_slots()
+        if waiting:
+            return
+
+        batch_size = max(self.app.config.RELOAD_BATCH_SIZE, 1)
+        for i in range(min(batch_size - booting, self.num_workers - ready - booting)):
+            index = expired.pop(0) if expired else None
+            if self.spawn_worker(index) is None:
+                break
+
     def spawn_workers(self):
-        for i in range(self.num_workers - len(self.WORKERS.keys())):
-            self.spawn_worker()
-            time.sleep(0.1 * random.random())
+        """Spawn the missing workers
+        A slot whose worker crashed is not respawned before its backoff
+        delay expires, see :meth:`backoff_slot`, the other workers keep
+        serving meanwhile.
+
+        """
+        parallel = self.app.config.PARALLEL_BOOT
+        waiting, expired = self.backoff_slots()
+        if waiting and not self.degraded:
+            self.degraded = True
+            self.logger.warning("Entering degraded mode, %s workers waiting to be respawned",
+                                len(waiting))
+
+        for i in range(self.num_workers - len(self.WORKERS.keys()) - len(waiting)):
+            index = expired.pop(0) if expired else None
+            if self.spawn_worker(index) is None:
+                break
+            if not parallel:
+                time.sleep(0.1 * random.random())
+
+    def backoff_slots(self):
+        """Return the free slots of crashed workers, split between the
+        ones still backing off and the ones that can be respawned.
+
+        """
+        now = time.time()
+        in_use = set([w.slot.index for w in self.WORKERS.values()])
+        waiting, expired = [], []
+        for index, (_, not_before) in sorted(self.backoff.items()):
+            if index in in_use:
+                continue
+            if not_before > now:
+                waiting.append(index)
+            else:
+                expired.append(index)
+        return waiting, expired
+
+    def assign_cpus(self):
+        """Return the cpus of a new worker for ``WORKER_CPU_AFFINITY``: the
+        first cpu set not used by a live worker, or the least used one when
+        there are more workers than cpu sets.
+
+        """
+        affinity = self.app.config.WORKER_CPU_AFFINITY
+        if not affinity:
+            return None
+        try:
+            sets = cpu_sets(affinity)
+        except (OSError, IOError, RuntimeError) as e:
+            self.logger.warning("Unable to set the cpu affinity: %s", e)
+            return None
+        if not sets:
+            self.logger.warning("No allowed cpu for worker affinity %r", affinity)
+            return None
+
+        used = [w.cpus for w in self.WORKERS.values()]
+        return min(sets, key=lambda cpus: used.count(cpus))
+
+    def spawn_worker(self, index=None):
+        """Fork a new worker
+
+        :param index: the preferred scoreboard slot of the worker
+        :return: the new worker, ``None`` if it couldn't be spawned
+        """
+        rate = self.app.config.SPAWN_RATE_LIMIT
+        if rate:
+            # token bucket allowing a burst of num_workers spawns
+            now = time.time()
+            capacity = max(self.num_workers, 1)
+            self.spawn_tokens = min(capacity, self.spawn_tokens + (now - self.spawn_refilled) * rate)
+            self.spawn_refilled = now
+            if self.spawn_tokens < 1:
+                self.logger.debug("Spawn rate limit reached")
+                return None
+            self.spawn_tokens -= 1
+
+        # the slots of crashed workers are kept for their respawn
+        slot = self.scoreboard.acquire(index, exclude=self.backoff)
+        if slot is None:
+            self.logger.error("No free scoreboard slot, increase SCOREBOARD_SIZE")
+            return None
 
-    def spawn_worker(self):
         self.worker_age += 1
 
         worker = self.worker_class(self.worker_age, self.pid, self.LISTENERS,
                                    self.app,
-                                   self.timeout / 2.0)
-        pid = os.fork()
+                                   self.timeout / 2.0,
+                                   slot=slot,
+                                   cpus=self.assign_cpus())
+        freeze = self.app.config.PRELOAD_APP and hasattr(gc, 'freeze')
+        if freeze:
+            # move the preloaded application out of the reach of the garbage
+            # collector of the worker so that it never writes to its
+            # copy-on-write pages, the master unfreezes its own objects
+            # right after the fork so that its garbage is still collected
+            gc.disable()
+            gc.freeze()
+        pid = None
+        try:
+            pid = os.fork()
+        finally:
+            if freeze:
+                if pid != 0:
+                    gc.unfreeze()
+                gc.enable()
         if pid != 0:
             # Parent process
             self.WORKERS[pid] = worker
-            return
+            return worker
 
         worker_pid = os.getpid()
         try:
@@ -172,7 +600,7 @@ class Arbiter(Signaler):
         finally:
             self.logger.info('Worker exiting (pid: %s)', worker_pid)
             try:
-                worker.tmp.close()
+                worker.slot.close()
             except:
                 self.logger.warning('Exception during worker exit: \n %s',
                                     traceback.format_exc())
@@ -189,7 +617,7 @@ class Arbiter(Signaler):
             if e.errno == errno.ESRCH:
                 try:
                     worker = self.WORKERS.pop(pid)
-                    worker.tmp.close()
+                    self.scoreboard.release(worker.slot)
                 except(OSError, KeyError):
                     return
             raise
@@ -208,35 +636,68 @@ class Arbiter(Signaler):
                     break
                 if self.reexec_pid == wpid:
                     self.reexec_pid = 0
+                    self.master_name = "Master"
                 else:
                     exit_code = status >> 8
-                    if exit_code == self.WORKER_BOOT_ERROR:
-                        reason = "Worker failed to boot."
-                        raise HaltServerException(reason, exit_code)
-                    if exit_code == self.APP_LOAD_ERROR:
-                        reason = "App failed to load."
-                        raise HaltServerException(reason, exit_code)
+                    if exit_code in (self.WORKER_BOOT_ERROR, self.APP_LOAD_ERROR):
+                        self.boot_failures += 1
+                        # only give up when no worker could ever boot
+                        if not self.ever_booted and self.boot_failures >= max(self.num_workers, 1):
+                            if exit_code == self.WORKER_BOOT_ERROR:
+                                reason = "Worker failed to boot."
+                            else:
+                                reason = "App failed to load."
+                            raise HaltServerException(reason, exit_code)
 
                     worker = self.WORKERS.pop(wpid, None)
                     if not worker:
                         continue
 
                     # TODO(benjamin): shut down worker
-                    worker.tmp.close()
+                    self.scoreboard.release(worker.slot)
+                    if status == 0 or worker.retired:
+                        self.backoff.pop(worker.slot.index, None)
+                    else:
+                        self.backoff_slot(wpid, worker, status)
         except OSError as e:
             # raise OSError when  master have no child process
             if e.errno != errno.ECHILD:
                 raise
 
+    def backoff_slot(self, pid, worker, status):
+        """Delay the respawn of a crashed worker exponentially,
+        from ``CRASH_BACKOFF_BASE`` up to ``CRASH_BACKOFF_MAX`` seconds.
+        The failures of a slot are forgotten once a worker has lived
+        longer than ``CRASH_BACKOFF_MAX``, see :meth:`forget_backoff`.
+
+        """
+        config = self.app.config
+        index = worker.slot.index
+        now = time.time()
+
+        failures, _ = self.backoff.get(index, (0, 0))
+        if now - worker.boot_started > config.CRASH_BACKOFF_MAX:
+            failures = 0
+        failures += 1
+
+        delay = min(config.CRASH_BACKOFF_BASE * 2 ** (failures - 1), config.CRASH_BACKOFF_MAX)
+        self.backoff[index] = (failures, now + delay)
+        if os.WIFSIGNALED(status):
+            reason = "was killed by signal %s" % os.WTERMSIG(status)
+        else:
+            reason = "exited with code %s" % os.WEXITSTATUS(status)
+        self.logger.warning("Worker (pid:%s) %s, respawning slot %s in %.1fs",
+                            pid, reason, index, delay)
+
     def murder_workers(self):
         if not self.timeout:
             return
 
-        for pid, worker in self.WORKERS.items():
-            try:
-                if time.time() - worker.tmp.last_update() <= self.timeout:
-                    continue
-            except (OSError, IOError):
+        now = time.time()
+        workers = list(self.WORKERS.items())
+        slots = self.scoreboard.snapshot([worker.slot for _, worker in workers])
+        for pid, worker in workers:
+            if now - slots[worker.slot.index].heartbeat <= self.timeout:
                 continue
 
             if not worker.aborted:
@@ -251,9 +712,21 @@ class Arbiter(Signaler):
     # --------------------------------------------------
     def sleep(self):
         try:
-            ready = select.select([self.PIPE[0]], [], [], 5.0)
+            # poll faster while workers are booting, not while the
+            # missing ones are all waiting on their backoff
+            timeout = 0.1 if self.spawns_pending else 1.0
+            fds = [self.PIPE[0]]
+            if self.control is not None:
+                fds.append(self.control)
+            ready = select.select(fds, [], [], timeout)
             if not ready[0]:
                 return
+            if self.control in ready[0]:
+                try:
+                    self.control.handle()
+                except Exception:
+                    # the control socket mustn't take the main loop down
+                    self.logger.exception("Error handling the control socket")
             while os.read(self.PIPE[0], 1):
                 pass
         except select.error as e:
@@ -292,10 +765,40 @@ class Arbiter(Signaler):
         # TODO(benjamin): process pidfile
 
         self.init_signals()
+        self.capacity_lost = time.time()
+        self.spawns_pending = True
+        self.ssl_rotated = time.time()
+        # the first autoscaling decision waits for a cooldown worth of
+        # busy ratio samples
+        self.last_scaled = time.time()
+        self.spawn_tokens = max(self.num_workers, 1)
+        self.spawn_refilled = time.time()
+
+        if self.scoreboard is None:
+            self.scoreboard = Scoreboard(self.app.config.SCOREBOARD_SIZE)
+
+        max_workers = max(self.app.config.MAX_WORKERS or 0, self.num_workers)
+        if max_workers + self.app.config.RELOAD_BATCH_SIZE > self.scoreboard.size:
+            self.logger.warning("SCOREBOARD_SIZE %s is too small for %s workers",
+                                self.scoreboard.size, max_workers)
+
+        if self.control is None and self.app.config.CONTROL_SOCKET:
+            self.control = ControlServer(self.app.config.CONTROL_SOCKET, self)
 
-        # TODO(benjamin): process socket listener
         if not self.LISTENERS:
-            self.LISTENERS = create_sockets(self.app.config, self.logger)
+            fds = None
+            self.systemd = os.environ.pop('TUNICORN_SYSTEMD', None) == '1'
+            if 'TUNICORN_FD' in os.environ:
+                fds = [int(fd) for fd in os.environ.pop('TUNICORN_FD').split(',') if fd]
+            else:
+                count = listen_fds()
+                if count:
+                    self.systemd = True
+                    fds = range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count)
+                    self.logger.debug("Socket activation sockets: %s", count)
+            self.LISTENERS = create_sockets(self.app.config, self.logger, fds=fds)
+
+        self.check_backlog()
 
         listeners_str = ",".join([str(l) for l in self.LISTENERS])
         self.logger.debug("Arbiter booted")
@@ -303,17 +806,21 @@ class Arbiter(Signaler):
         self.logger.info("Using worker: %s", self.worker_class.__name__)
 
     def stop(self, graceful=True):
-        if self.reexec_pid == 0 and self.master_pid == 0:
+        # sockets inherited from systemd are owned by it
+        if self.reexec_pid == 0 and self.master_pid == 0 and not self.systemd:
             for l in self.LISTENERS:
                 l.close()
         self.LISTENERS = []
 
+        if self.control is not None:
+            self.control.close()
+            self.control = None
+
         sig = signal.SIGTERM
         if not graceful:
             sig = signal.SIGQUIT
 
-        # TODO(benjamin): graceful timeout come from configuration
-        limit = time.time() + 5
+        limit = time.time() + self.graceful_timeout
 
         self.kill_workers(sig)
 
@@ -322,12 +829,100 @@ class Arbiter(Signaler):
 
         self.kill_workers(signal.SIGKILL)
 
-    # TODO(benjamin): reload code and configuration
     def reload(self):
-        pass
+        """Reload code and configuration
+        The configuration file is read again and the application module is
+        re-imported, then the workers are replaced in batches by
+        :meth:`replace_workers`. The running configuration is kept if any
+        of these steps fails.
+
+        :return: ``True`` when the reload has started
+        """
+        settings = listener_settings(self.app.config)
+        try:
+            self.app.reload()
+        except Exception:
+            self.logger.exception("Reload failed, keeping the current configuration")
+            return False
+
+        config = self.app.config
+        self.worker_class = config.WORKER_CLASS
+        self.num_workers = config.WORKERS
+        self.timeout = config.TIMEOUT
+        self.graceful_timeout = config.GRACEFUL_TIMEOUT
+
+        rebind = listener_settings(config) != settings
+        if rebind and self.systemd:
+            self.logger.warning("BIND change ignored, the listeners come from systemd")
+        if rebind and not self.systemd:
+            for l in self.LISTENERS:
+                l.close()
+            self.LISTENERS = create_sockets(config, self.logger)
+            self.check_backlog()
+            listeners_str = ",".join([str(l) for l in self.LISTENERS])
+            self.logger.info("Listening at: %s", listeners_str)
+        else:
+            # the new workers pick the application and the limits of
+            # their listeners up from it
+            for l in self.LISTENERS:
+                l.conf = listener_conf(config, l.getsockname())
+
+        self.reload_age = self.worker_age
+        # the new configuration comes with new TLS contexts
+        self.ssl_rotated = time.time()
+        return True
+
+    def drain(self):
+        """Gracefully stop all the workers, the master keeps running
+
+        """
+        self.logger.info("graceful stop of workers")
+        self.num_workers = 0
+        self.kill_workers(signal.SIGTERM)
 
     def reexec(self):
-        pass
+        """Relaunch the master and workers
+        The new master is forked from the current one and inherits the
+        bound listeners through ``TUNICORN_FD``, both worker sets keep
+        serving until the old master is told to quit.
+
+        """
+        if self.reexec_pid != 0:
+            self.logger.warning("USR2 signal ignored. Child exists.")
+            return
+
+        if self.master_pid != 0:
+            self.logger.warning("USR2 signal ignored. Parent exists.")
+            return
+
+        master_pid = os.getpid()
+        self.reexec_pid = os.fork()
+        if self.reexec_pid != 0:
+            self.master_name = "Old Master"
+            self.logger.info("Reexecuting master with pid: %s", self.reexec_pid)
+            return
+
+        environ = os.environ.copy()
+        environ['TUNICORN_PID'] = str(master_pid)
+        environ['TUNICORN_FD'] = ','.join([str(l.fileno()) for l in self.LISTENERS])
+        if self.systemd:
+            environ['TUNICORN_SYSTEMD'] = '1'
+
+        os.chdir(self.START_CTX['cwd'])
+        os.execvpe(self.START_CTX[0], self.START_CTX['args'], environ)
+
+    def maybe_promote_master(self):
+        """Promote a reexecuted master once its parent has exited
+
+        """
+        if self.master_pid == 0:
+            return
+
+        if self.master_pid != os.getppid():
+            self.logger.info("Master has been promoted.")
+            self.master_pid = 0
+            self.proc_name = self.proc_name.rsplit('.', 1)[0]
+            os.environ.pop('TUNICORN_PID', None)
 
     # --------------------------------------------------
     # public methods
@@ -341,8 +936,13 @@ class Arbiter(Signaler):
                 sig = self.SIG_QUEUE.pop(0) if len(self.SIG_QUEUE) else None
                 if sig is None:
                     self.sleep()
+                    self.maybe_promote_master()
                     self.murder_workers()
+                    self.autoscale_workers()
+                    self.rotate_ssl_contexts()
                     self.manage_workers()
+                    self.log_workers_memory()
+                    self.log_listeners_backlog()
                     continue
 
                 if sig not in self.SIG_NAMES:
@@ -367,7 +967,7 @@ class Arbiter(Signaler):
         except SystemExit:
             raise
         except Exception as e:
-            print e
+            print(e)
             self.logger.warning("Unhandled exception in main loop", exc_info=True)
             self.stop(False)
             if self.pidfile is not None:
@@ -0,0 +1,209 @@
+"""
+Buffered connections for the handlers doing their own framing
+"""
+from .exceptions import IncompleteReadError
+from .exceptions import LimitOverrunError
+
+# the most chunks a sendmsg call takes on linux
+IOV_MAX = 1024
+
+
+class BufferPool(object):
+    """\
+    Read buffers of ``size`` bytes reused by the connections of a
+    worker, at most ``count`` of them are kept while unused.
+    """
+
+    def __init__(self, size, count=64):
+        self.size = size
+        self.count = count
+        self.buffers = []
+
+    def acquire(self):
+        try:
+            return self.buffers.pop()
+        except IndexError:
+            return bytearray(self.size)
+
+    def release(self, buf):
+        if len(buf) == self.size and len(self.buffers) < self.count:
+            self.buffers.append(buf)
+
+
+class BufferedConnection(object):
+    """\
+    Accepted connection read with ``recv_into`` into one reusable buffer,
+    from ``pool`` when given. The read methods return ``memoryview``
+    slices of the buffer, no copy is made: a slice is only valid until
+    the next read, ``tobytes()`` keeps its content. The buffer grows
+    for a frame longer than it.
+
+    The writes are queued by :meth:`write` and sent together by
+    :meth:`flush` with ``sendmsg`` when the socket has it, TLS sockets
+    and python 2 join them first. They are flushed as soon as a buffer
+    worth of bytes or ``IOV_MAX`` chunks are queued. The other methods
+    are the ones of the socket.
+    """
+
+    def __init__(self, sock, pool=None, size=65536):
+        self.sock = sock
+        self.pool = pool
+        self.pooled = pool.acquire() if pool is not None else bytearray(size)
+        self.buf = self.pooled
+        self.view = memoryview(self.buf)
+        # the buffered data is buf[start:end]
+        self.start = 0
+        self.end = 0
+        self.eof = False
+        self.pending = []
+        self.pending_size = 0
+        # the queued bytes flushed without waiting for flush()
+        self.flush_size = len(self.pooled)
+        self.vectored = True
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    # --------------------------------------------------
+    # reads
+    # --------------------------------------------------
+    def fill(self, size=1):
+        """Read from the socket until ``size`` bytes are buffered or the
+        connection is closed, return whether they are."""
+        while self.end - self.start < size and not self.eof:
+            if len(self.buf) - self.start < size:
+                self.make_room(size)
+            elif self.end == len(self.buf):
+                self.make_room(len(self.buf) - self.start)
+            n = self.sock.recv_into(self.view[self.end:])
+            if not n:
+                self.eof = True
+            self.end += n
+        return self.end - self.start >= size
+
+    def make_room(self, size):
+        """Move the buffered data to the start of the buffer, or to a
+        larger one when ``size`` bytes don't fit in it."""
+        length = self.end - self.start
+        if size > len(self.buf):
+            buf = bytearray(max(size, 2 * len(self.buf)))
+            buf[:length] = self.view[self.start:self.end]
+            # the slices already returned keep the previous buffer
+            self.buf = buf
+            self.view = memoryview(buf)
+        elif self.start:
+            # same size assignment, allowed while slices are exported
+            self.view[:length] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = length
+
+    def consume(self, size):
+        view = self.view[self.start:self.start + size]
+        self.start += size
+        if self.start == self.end:
+            self.start = self.end = 0
+        return view
+
+    def peek(self, size=1):
+        """Return the buffered data, at least ``size`` bytes unless the
+        connection is closed, without consuming it."""
+        self.fill(size)
+        return self.view[self.start:self.end]
+
+    def read(self, size=-1):
+        """Return up to ``size`` bytes, all the buffered ones by default,
+        reading once from the socket when nothing is buffered. An empty
+        slice means the connection is closed."""
+        if size == 0:
+            return self.view[self.start:self.start]
+        self.fill(1)
+        available = self.end - self.start
+        return self.consume(available if size < 0 else min(size, available))
+
+    def readexactly(self, size):
+        if not self.fill(size):
+            raise IncompleteReadError(self.consume(self.end - self.start).tobytes(), size)
+        return self.consume(size)
+
+    def readuntil(self, separator=b'\n', limit=None):
+        """Return the data up to and including ``separator``. More than
+        ``limit`` bytes, the size of the buffer by default, without it
+        raise :class:`LimitOverrunError`."""
+        limit = limit or len(self.pooled)
+        offset = 0
+        while True:
+            index = self.buf.find(separator, self.start + offset, self.end)
+            if index != -1:
+                return self.consume(index + len(separator) - self.start)
+            length = self.end - self.start
+            if length > limit:
+                raise LimitOverrunError("Separator not found in %s bytes" % limit)
+            # the separator may start in the last bytes already searched
+            offset = max(0, length - len(separator) + 1)
+            if not self.fill(length + 1):
+                raise IncompleteReadError(self.consume(length).tobytes(), None)
+
+    def readline(self, limit=None):
+        """Like :meth:`readuntil` with ``\\n``, the data buffered before
+        the end of the connection is returned without it."""
+        try:
+            return self.readuntil(b'\n', limit)
+        except IncompleteReadError as e:
+            return memoryview(e.partial)
+
+    # --------------------------------------------------
+    # writes
+    # --------------------------------------------------
+    def write(self, data):
+        """Queue ``data`` until the next :meth:`flush`, it must not be
+        modified before."""
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= self.flush_size or len(self.pending) >= IOV_MAX:
+            self.flush()
+
+    def writelines(self, chunks):
+        for chunk in chunks:
+            self.write(chunk)
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.pending_size = 0
+        if not pending:
+            return
+        if self.vectored:
+            try:
+                self.writev(pending)
+                return
+            except (AttributeError, NotImplementedError):
+                self.vectored = False
+        data = bytearray()
+        for chunk in pending:
+            data += chunk
+        self.sock.sendall(data)
+
+    def writev(self, chunks):
+        """Send ``chunks`` with as few ``sendmsg`` calls as possible"""
+        views = [memoryview(chunk) for chunk in chunks]
+        while views:
+            sent = self.sock.sendmsg(views[:IOV_MAX])
+            # drop the chunks sent, keep the tail of a partial one
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views and sent:
+                views[0] = views[0][sent:]
+
+    def sendall(self, data):
+        self.flush()
+        self.sock.sendall(data)
+
+    def close(self):
+        """Flush the queued writes and close the socket"""
+        try:
+            self.flush()
+        finally:
+            if self.pool is not None and self.pooled is not None:
+                self.pool.release(self.pooled)
+            self.pooled = None
+            self.sock.close()
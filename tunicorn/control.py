@@ -0,0 +1,228 @@
+import errno
+import json
+import os
+import socket
+import stat
+import sys
+import time
+from argparse import ArgumentParser
+
+from .config import Config
+from .util import close_on_exec
+from .workers.scoreboard import STATE_NAMES
+
+# maximum size of a request line
+MAX_REQUEST_SIZE = 65536
+
+# seconds a connection has to send its request and read the response,
+# the main loop of the arbiter waits for it
+REQUEST_TIMEOUT = 1.0
+
+
+class ControlServer(object):
+    """Unix-domain control socket served by the arbiter
+
+    Every connection carries one request and one response, both are a
+    JSON object on a single line::
+
+        {"command": "scale", "workers": 4}
+        {"ok": true, "result": {"workers": 4}}
+
+    The commands are run from the main loop of the arbiter, see
+    :meth:`Arbiter.sleep`. They must not fork, the workers are spawned
+    by the main loop once the response has been sent.
+    """
+
+    def __init__(self, path, arbiter):
+        self.path = path
+        self.arbiter = arbiter
+        self.logger = arbiter.logger
+
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            if stat.S_ISSOCK(st.st_mode):
+                os.remove(path)
+            else:
+                raise ValueError("%r is not a socket" % path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            self.sock.bind(path)
+        finally:
+            os.umask(old_umask)
+        self.inode = os.stat(path).st_ino
+        self.sock.listen(16)
+        self.sock.setblocking(0)
+        close_on_exec(self.sock.fileno())
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def handle(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except socket.error as e:
+                if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    # e.g. EMFILE, the connection is accepted on a later turn
+                    self.logger.warning("Control socket accept failed: %s", e)
+                return
+
+            try:
+                self.handle_client(client)
+            except (socket.error, ValueError) as e:
+                self.logger.warning("Control connection failed: %s", e)
+            finally:
+                client.close()
+
+    def handle_client(self, client):
+        # one deadline for the whole request, a client sending it byte
+        # by byte doesn't get a new timeout per read
+        deadline = time.time() + REQUEST_TIMEOUT
+        client.setblocking(1)
+
+        data = b''
+        while not data.endswith(b'\n') and len(data) < MAX_REQUEST_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout("Control request not received after %ss" % REQUEST_TIMEOUT)
+            client.settimeout(remaining)
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+
+        request = json.loads(data.decode('utf-8'))
+        response = self.dispatch(request)
+        client.settimeout(max(deadline - time.time(), 0.1))
+        client.sendall(json.dumps(response, default=repr).encode('utf-8') + b'\n')
+
+    def dispatch(self, request):
+        command = request.get('command') if isinstance(request, dict) else None
+        handler = getattr(self, 'do_%s' % command, None)
+        if handler is None:
+            return {'ok': False, 'error': 'Unknown command: %r' % command}
+
+        self.logger.info('Handling control command: %s', command)
+        try:
+            return {'ok': True, 'result': handler(request)}
+        except Exception as e:
+            self.logger.exception('Control command %s failed', command)
+            return {'ok': False, 'error': str(e)}
+
+    # --------------------------------------------------
+    # commands
+    # --------------------------------------------------
+    def do_workers(self, request):
+        arbiter = self.arbiter
+        workers = sorted(arbiter.WORKERS.items(), key=lambda w: w[1].age)
+        slots = arbiter.scoreboard.snapshot([worker.slot for _, worker in workers])
+        result = []
+        for pid, worker in workers:
+            slot = slots[worker.slot.index]
+            result.append({
+                'pid': pid,
+                'age': worker.age,
+                'slot': worker.slot.index,
+                'state': STATE_NAMES.get(slot.state),
+                'retired': worker.retired,
+                'recycle': bool(slot.recycle),
+                'heartbeat': slot.heartbeat,
+                'requests': slot.requests,
+                'active': slot.active,
+                'request_started': slot.request_started,
+                'rss': slot.rss,
+                'uss': slot.uss,
+                'saturations': slot.saturations,
+                'timeouts': slot.timeouts
+            })
+        return result
+
+    def do_scale(self, request):
+        workers = int(request['workers'])
+        if workers < 0:
+            raise ValueError("The number of workers can't be negative")
+        self.arbiter.num_workers = workers
+        return {'workers': self.arbiter.num_workers}
+
+    def do_reload(self, request):
+        if not self.arbiter.reload():
+            raise RuntimeError("Reload failed, see the logs of the master")
+        return {'workers': self.arbiter.num_workers}
+
+    def do_drain(self, request):
+        self.arbiter.drain()
+        return {'workers': len(self.arbiter.WORKERS)}
+
+    def do_config(self, request):
+        return dict(self.arbiter.app.config)
+
+    def close(self):
+        self.sock.close()
+        # a reexecuted master may have taken the path over
+        try:
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def request(path, command, timeout=10.0, **kwargs):
+    """Send a command to the control socket of a running arbiter"""
+    kwargs['command'] = command
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(kwargs).encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    return json.loads(data.decode('utf-8'))
+
+
+def run_ctl(argv):
+    parser = ArgumentParser('tunicorn ctl')
+    parser.add_argument('-s', '--socket', dest='socket', help='control socket path')
+    parser.add_argument('-c', '--config', dest='filename',
+                        help='configuration file to read CONTROL_SOCKET from')
+    parser.add_argument('command', choices=['workers', 'scale', 'reload', 'drain', 'config'])
+    parser.add_argument('workers', nargs='?', type=int, help='number of workers for scale')
+    args = parser.parse_args(argv)
+
+    path = args.socket
+    if path is None and args.filename:
+        config = Config(os.getcwd())
+        config.from_pyfile(args.filename)
+        path = config.CONTROL_SOCKET
+    if path is None:
+        parser.error('no control socket, use --socket or --config')
+
+    kwargs = {}
+    if args.command == 'scale':
+        if args.workers is None:
+            parser.error('scale needs the number of workers')
+        kwargs['workers'] = args.workers
+
+    try:
+        response = request(path, args.command, **kwargs)
+    except (socket.error, ValueError) as e:
+        sys.stderr.write('Unable to reach %s: %s\n' % (path, e))
+        return 1
+
+    if not response.get('ok'):
+        sys.stderr.write('%s\n' % response.get('error'))
+        return 1
+
+    sys.stdout.write(json.dumps(response.get('result'), indent=2, sort_keys=True) + '\n')
+    return 0
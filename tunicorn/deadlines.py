@@ -0,0 +1,187 @@
+"""
+Idle, read and write deadlines of the accepted connections
+"""
+import socket
+
+from .exceptions import DeadlineExpired
+
+
+class Deadline(object):
+    __slots__ = ('expires', 'callback', 'bucket')
+
+    def __init__(self, expires, callback):
+        self.expires = expires
+        self.callback = callback
+        self.bucket = None
+
+
+class TimerWheel(object):
+    """\
+    Hashed timer wheel: the deadlines are kept in ``size`` buckets of
+    ``resolution`` seconds and :meth:`advance` only looks at the buckets
+    of the ticks elapsed since its last call. Scheduling and cancelling
+    a deadline are a set operation, far cheaper than a timer of the event
+    loop per socket call. A deadline fires up to ``resolution`` seconds
+    late.
+    """
+
+    def __init__(self, now, resolution=1.0, size=512):
+        self.resolution = resolution
+        self.buckets = [set() for _ in range(size)]
+        self.tick = int(now / resolution)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def schedule(self, expires, callback):
+        """Call ``callback()`` once ``expires`` has passed, unless the
+        returned deadline is cancelled first."""
+        deadline = Deadline(expires, callback)
+        # the bucket of the first tick after the deadline, the next one
+        # for a deadline already passed
+        tick = max(int(expires / self.resolution) + 1, self.tick + 1)
+        deadline.bucket = self.buckets[tick % len(self.buckets)]
+        deadline.bucket.add(deadline)
+        return deadline
+
+    def cancel(self, deadline):
+        if deadline.bucket is not None:
+            deadline.bucket.discard(deadline)
+            deadline.bucket = None
+
+    def advance(self, now):
+        """Fire the deadlines passed at ``now``, return how many fired"""
+        fired = 0
+        tick = int(now / self.resolution)
+        # a full turn visits every bucket
+        last = min(tick, self.tick + len(self.buckets))
+        while self.tick < last:
+            self.tick += 1
+            bucket = self.buckets[self.tick % len(self.buckets)]
+            # the deadlines of the next turns stay in the bucket
+            expired = [d for d in bucket if d.expires <= now]
+            for deadline in expired:
+                bucket.discard(deadline)
+                deadline.bucket = None
+                deadline.callback()
+                fired += 1
+        self.tick = tick
+        return fired
+
+
+class DeadlineSocket(object):
+    """\
+    Accepted connection enforcing the deadlines of its listener:
+
+    - ``IDLE_TIMEOUT`` for the first read and the reads following a
+      write, i.e. while the client has to send its next request
+    - ``READ_TIMEOUT`` for the other reads
+    - ``WRITE_TIMEOUT`` for the writes
+
+    The time the handler spends between two calls doesn't count. Once a
+    deadline expires the connection is shut down, which wakes up the
+    call waiting on it, and the calls raise :class:`DeadlineExpired`.
+    The other methods are the ones of the socket.
+    """
+
+    def __init__(self, sock, wheel, conf, clock, on_expire=None):
+        self._sock = sock
+        self._wheel = wheel
+        self._clock = clock
+        self._on_expire = on_expire
+        self.idle_timeout = conf.IDLE_TIMEOUT
+        self.read_timeout = conf.READ_TIMEOUT
+        self.write_timeout = conf.WRITE_TIMEOUT
+        self.idle = True
+        self.expired = None
+        self.deadline = None
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def recv(self, *args, **kwargs):
+        return self._read(self._sock.recv, *args, **kwargs)
+
+    def recv_into(self, *args, **kwargs):
+        return self._read(self._sock.recv_into, *args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        return self._write(self._sock.send, *args, **kwargs)
+
+    def sendall(self, *args, **kwargs):
+        return self._write(self._sock.sendall, *args, **kwargs)
+
+    def sendmsg(self, *args, **kwargs):
+        return self._write(self._sock.sendmsg, *args, **kwargs)
+
+    def close(self):
+        self._cancel()
+        self._sock.close()
+
+    def _read(self, method, *args, **kwargs):
+        kind = 'idle' if self.idle else 'read'
+        result = self._call(kind, self.idle_timeout if self.idle else self.read_timeout,
+                            method, *args, **kwargs)
+        self.idle = False
+        return result
+
+    def _write(self, method, *args, **kwargs):
+        result = self._call('write', self.write_timeout, method, *args, **kwargs)
+        self.idle = True
+        return result
+
+    def _call(self, kind, timeout, method, *args, **kwargs):
+        if self.expired:
+            raise DeadlineExpired("%s timeout" % self.expired)
+        if timeout:
+            self.deadline = self._wheel.schedule(self._clock() + timeout,
+                                                 lambda: self._expire(kind))
+        try:
+            result = method(*args, **kwargs)
+        except socket.error:
+            if self.expired:
+                raise DeadlineExpired("%s timeout" % self.expired)
+            raise
+        finally:
+            self._cancel()
+        # a read woken up by the shutdown returns EOF
+        if self.expired:
+            raise DeadlineExpired("%s timeout" % self.expired)
+        return result
+
+    def _cancel(self):
+        if self.deadline is not None:
+            self._wheel.cancel(self.deadline)
+            self.deadline = None
+
+    def _expire(self, kind):
+        self.deadline = None
+        self.expired = kind
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        if self._on_expire is not None:
+            self._on_expire(kind)
+
+
+class TimeoutSocket(DeadlineSocket):
+    """\
+    :class:`DeadlineSocket` for the workers blocking in the socket calls,
+    the deadlines are the timeout of the socket instead of a timer wheel.
+    """
+
+    def __init__(self, sock, conf, on_expire=None):
+        super(TimeoutSocket, self).__init__(sock, None, conf, None, on_expire)
+
+    def _call(self, kind, timeout, method, *args, **kwargs):
+        if self.expired:
+            raise DeadlineExpired("%s timeout" % self.expired)
+        self._sock.settimeout(timeout or None)
+        try:
+            return method(*args, **kwargs)
+        except socket.timeout:
+            self.expired = kind
+            if self._on_expire is not None:
+                self._on_expire(kind)
+            raise DeadlineExpired("%s timeout" % kind)
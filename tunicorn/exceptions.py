@@ -1,3 +1,6 @@
+import socket
+
+
 class BaseError(Exception):
     """
 
@@ -24,3 +27,30 @@ class HaltServerException(TunicornException):
 
 class AppImportException(TunicornException):
     pass
+
+
+class ProxyProtocolError(TunicornException):
+    pass
+
+
+class DeadlineExpired(TunicornException, socket.timeout):
+    pass
+
+
+class IncompleteReadError(TunicornException):
+    """The connection was closed before the end of a frame, ``partial``
+    holds the bytes read, ``expected`` the size of the frame."""
+
+    def __init__(self, partial, expected):
+        self.partial = partial
+        self.expected = expected
+        super(IncompleteReadError, self).__init__(
+            "%d bytes read on %s expected bytes" % (len(partial), expected))
+
+
+class LimitOverrunError(TunicornException):
+    pass
+
+
+class FramingError(TunicornException):
+    pass
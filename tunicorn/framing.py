@@ -0,0 +1,330 @@
+"""
+Framing codecs and the pipelined processing of the frames of a
+connection::
+
+    @framed(LineCodec())
+    def app(frame):
+        return frame.tobytes().upper()
+
+The frames buffered by one read are all handled before the next one
+and their responses are sent at once, a client pipelining its
+requests costs about one read and one write per batch.
+"""
+import struct
+
+from six import binary_type
+from six import integer_types
+from six import text_type
+
+from .connection import BufferedConnection
+from .exceptions import FramingError
+
+# the default limit of the size of a frame
+MAX_FRAME_SIZE = 1024 * 1024
+
+# the default limits of the nesting and of the length of the RESP arrays
+MAX_RESP_DEPTH = 32
+MAX_RESP_LENGTH = 1024 * 1024
+
+
+class Codec(object):
+    """\
+    Codecs are stateless, one instance is shared by the connections.
+
+    :meth:`decode` looks for a frame at ``start`` in the bytearray
+    ``buf``, up to ``end``, and returns ``(frame, size)``, ``None`` when
+    the frame isn't complete yet. :meth:`encode` returns the chunks of
+    the frame of a response.
+
+    :meth:`decoder` returns the decode function of one connection, a
+    codec keeping the state of a partial frame between its reads returns
+    a new one.
+    """
+
+    def __init__(self, max_size=MAX_FRAME_SIZE):
+        self.max_size = max_size
+
+    def decoder(self):
+        return self.decode
+
+    def decode(self, buf, start, end):
+        raise NotImplementedError()
+
+    def encode(self, payload):
+        raise NotImplementedError()
+
+
+class LengthPrefixedCodec(Codec):
+    """Frames prefixed with their length, a big endian uint32 by default"""
+
+    def __init__(self, prefix='!I', max_size=MAX_FRAME_SIZE):
+        super(LengthPrefixedCodec, self).__init__(max_size)
+        self.prefix = struct.Struct(prefix)
+
+    def decode(self, buf, start, end):
+        if end - start < self.prefix.size:
+            return None
+        length, = self.prefix.unpack_from(buf, start)
+        if length > self.max_size:
+            raise FramingError("Frame of %s bytes above %s" % (length, self.max_size))
+        size = self.prefix.size + length
+        if end - start < size:
+            return None
+        return memoryview(buf)[start + self.prefix.size:start + size], size
+
+    def encode(self, payload):
+        return [self.prefix.pack(len(payload)), payload]
+
+
+class LineCodec(Codec):
+    """Frames ended by ``delimiter``, the frame doesn't include it"""
+
+    def __init__(self, delimiter=b'\n', max_size=MAX_FRAME_SIZE):
+        super(LineCodec, self).__init__(max_size)
+        self.delimiter = delimiter
+
+    def decode(self, buf, start, end):
+        index = buf.find(self.delimiter, start, end)
+        if index == -1:
+            if end - start > self.max_size:
+                raise FramingError("No delimiter in %s bytes" % self.max_size)
+            return None
+        return memoryview(buf)[start:index], index - start + len(self.delimiter)
+
+    def encode(self, payload):
+        return [payload, self.delimiter]
+
+
+class NetstringCodec(Codec):
+    """``<length>:<data>,`` frames, see https://cr.yp.to/proto/netstrings.txt"""
+
+    def decode(self, buf, start, end):
+        digits = len(str(self.max_size))
+        colon = buf.find(b':', start, min(end, start + digits + 1))
+        if colon == -1:
+            if end - start > digits:
+                raise FramingError("Invalid netstring length %r" % bytes(buf[start:start + digits + 1]))
+            return None
+        # int() also takes signs, spaces and underscores
+        length = bytes(buf[start:colon])
+        if not length.isdigit() or int(length) > self.max_size:
+            raise FramingError("Invalid netstring length %r" % length)
+        length = int(length)
+
+        size = colon - start + length + 2
+        if end - start < size:
+            return None
+        if buf[start + size - 1] != ord(b','):
+            raise FramingError("Netstring not ended by a comma")
+        return memoryview(buf)[colon + 1:colon + 1 + length], size
+
+    def encode(self, payload):
+        return [b'%d:' % len(payload), payload, b',']
+
+
+class RespSimpleString(binary_type):
+    """A RESP simple string response, e.g. ``RespSimpleString(b'OK')``"""
+
+
+class RespError(Exception):
+    """A RESP error, returned as a response or decoded from a frame"""
+
+    def __init__(self, message):
+        super(RespError, self).__init__(message)
+        self.message = message
+
+
+class RespCodec(Codec):
+    """\
+    Redis serialization protocol frames. A frame decodes to a list for
+    an array, a memoryview for a bulk string, bytes for a simple string,
+    an int, ``None`` or a :class:`RespError`. An inline command decodes
+    to the list of its words, memoryviews as well.
+
+    The responses are encoded from the same types: bytes and text as
+    bulk strings, :class:`RespSimpleString` as a simple string, ints,
+    ``None``, lists and tuples, and :class:`RespError`.
+
+    A frame is at most ``max_size`` bytes, whatever it contains, and its
+    arrays are at most ``max_length`` items nested at most ``max_depth``
+    deep.
+    """
+
+    def __init__(self, max_size=MAX_FRAME_SIZE, max_depth=MAX_RESP_DEPTH,
+                 max_length=MAX_RESP_LENGTH):
+        super(RespCodec, self).__init__(max_size)
+        self.max_depth = max_depth
+        self.max_length = max_length
+
+    def decoder(self):
+        return RespDecoder(self).decode
+
+    def decode(self, buf, start, end):
+        return RespDecoder(self).decode(buf, start, end)
+
+    def parse(self, buf, end, state):
+        """Parse the frame from where ``state`` stopped, return the
+        value and the end of the frame, ``None`` when more bytes are
+        needed."""
+        view = memoryview(buf)
+        position = state.position
+        # the arrays being parsed, innermost last, with their length
+        stack = state.stack
+        while True:
+            state.position = position
+            line_end = buf.find(b'\r\n', position, end)
+            if line_end == -1:
+                # the buffered bytes all belong to the frame
+                if end - state.start > self.max_size:
+                    raise FramingError("RESP frame above %s bytes" % self.max_size)
+                return None
+            kind = buf[position:position + 1]
+            line = bytes(buf[position + 1:line_end])
+            following = line_end + 2
+            if following - state.start > self.max_size:
+                raise FramingError("RESP frame above %s bytes" % self.max_size)
+
+            if kind == b'+':
+                value = line
+            elif kind == b'-':
+                value = RespError(line)
+            elif kind in (b':', b'$', b'*'):
+                try:
+                    number = int(line)
+                except ValueError:
+                    raise FramingError("Invalid RESP %s line %r" % (kind, line))
+                if kind == b':' or number == -1:
+                    value = number if kind == b':' else None
+                elif not 0 <= number <= (self.max_size if kind == b'$' else self.max_length):
+                    raise FramingError("Invalid RESP %s length %s" % (kind, number))
+                elif kind == b'$':
+                    if following + number + 2 - state.start > self.max_size:
+                        raise FramingError("RESP frame above %s bytes" % self.max_size)
+                    if end < following + number + 2:
+                        return None
+                    if buf[following + number:following + number + 2] != b'\r\n':
+                        raise FramingError("RESP bulk string not ended by CRLF")
+                    value = view[following:following + number]
+                    following += number + 2
+                elif number == 0:
+                    value = []
+                else:
+                    if len(stack) >= self.max_depth:
+                        raise FramingError("RESP arrays nested deeper than %s" % self.max_depth)
+                    stack.append(([], number))
+                    position = following
+                    continue
+            else:
+                # an inline command, e.g. from telnet
+                value = [memoryview(word) for word in bytes(buf[position:line_end]).split()]
+            position = following
+
+            # the value completes the arrays it is the last item of
+            while stack:
+                items, length = stack[-1]
+                items.append(value)
+                if len(items) < length:
+                    break
+                value = stack.pop()[0]
+            if not stack:
+                return value, position
+
+    def encode(self, payload):
+        chunks = []
+        self.serialize(payload, chunks)
+        return chunks
+
+    def serialize(self, payload, chunks):
+        if payload is None:
+            chunks.append(b'$-1\r\n')
+        elif isinstance(payload, RespSimpleString):
+            chunks.extend((b'+', payload, b'\r\n'))
+        elif isinstance(payload, RespError):
+            message = payload.message
+            if isinstance(message, text_type):
+                message = message.encode('utf-8')
+            chunks.extend((b'-', message, b'\r\n'))
+        elif isinstance(payload, integer_types):
+            chunks.append(b':%d\r\n' % payload)
+        elif isinstance(payload, (list, tuple)):
+            chunks.append(b'*%d\r\n' % len(payload))
+            for item in payload:
+                self.serialize(item, chunks)
+        else:
+            if isinstance(payload, text_type):
+                payload = payload.encode('utf-8')
+            payload = memoryview(payload)
+            chunks.extend((b'$%d\r\n' % len(payload), payload, b'\r\n'))
+
+
+class RespDecoder(object):
+    """\
+    Parse state of the RESP frames of one connection: the parse of a
+    partial frame resumes where it stopped once more bytes are read,
+    unless the connection moved its buffer meanwhile.
+    """
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.reset(None, 0)
+
+    def reset(self, buf, start):
+        self.buf = buf
+        self.start = start
+        self.position = start
+        self.stack = []
+
+    def decode(self, buf, start, end):
+        if buf is not self.buf or start != self.start:
+            self.reset(buf, start)
+        result = self.codec.parse(buf, end, self)
+        if result is None:
+            return None
+        # the next frame is parsed from its start
+        self.reset(None, 0)
+        value, position = result
+        return value, position - start
+
+
+def serve_frames(connection, codec, handle_frame):
+    """\
+    Decode the frames of ``connection`` with ``codec`` and call
+    ``handle_frame(frame)`` for each of them, in order, until the
+    connection is closed. The response it returns, if not ``None``, is
+    encoded with the codec. The responses to the frames of one read are
+    sent together before reading again.
+
+    A frame is only valid until ``handle_frame`` returns, like its
+    response: they may be slices of the read buffer.
+    """
+    if not isinstance(connection, BufferedConnection):
+        connection = BufferedConnection(connection)
+    decode = codec.decoder()
+
+    while True:
+        while True:
+            result = decode(connection.buf, connection.start, connection.end)
+            if result is None:
+                break
+            frame, size = result
+            connection.consume(size)
+            response = handle_frame(frame)
+            if response is not None:
+                connection.writelines(codec.encode(response))
+        connection.flush()
+
+        # a partial frame at the end of the connection is dropped
+        if not connection.fill(connection.end - connection.start + 1):
+            return
+
+
+def framed(codec):
+    """Make a handler of the ``handle_frame(frame)`` function, see
+    :func:`serve_frames`."""
+    def decorator(handle_frame):
+        def handler(listener, client, address):
+            serve_frames(client, codec, handle_frame)
+        handler.__name__ = handle_frame.__name__
+        handler.__doc__ = handle_frame.__doc__
+        return handler
+    return decorator
@@ -0,0 +1,130 @@
+"""
+PROXY protocol v1 and v2 headers sent by L4 load balancers in front of
+the listeners, see
+https://www.haproxy.org/download/2.0/doc/proxy-protocol.txt
+"""
+import socket
+import struct
+
+from .exceptions import ProxyProtocolError
+
+V1_PREFIX = b'PROXY '
+# the longest v1 header, CRLF included
+V1_MAX_SIZE = 107
+
+V2_SIGNATURE = b'\r\n\r\n\x00\r\nQUIT\n'
+V2_HEADER = struct.Struct('!12sBBH')
+V2_CMD_LOCAL = 0x0
+V2_CMD_PROXY = 0x1
+
+# address family and transport byte -> (family, address block format)
+V2_ADDRESSES = {
+    0x11: (socket.AF_INET, struct.Struct('!4s4sHH')),
+    0x12: (socket.AF_INET, struct.Struct('!4s4sHH')),
+    0x21: (socket.AF_INET6, struct.Struct('!16s16sHH')),
+    0x22: (socket.AF_INET6, struct.Struct('!16s16sHH')),
+}
+
+# the header is read at once, a longer one (e.g. with large TLVs) is
+# refused
+MAX_HEADER_SIZE = 4096
+
+
+def read_proxy_header(sock, timeout):
+    """
+    Read the PROXY protocol header at the start of a connection and
+    return the address of the client, ``None`` when the header doesn't
+    carry one (``UNKNOWN``, ``LOCAL`` or an unsupported family) and the
+    address of the connection must be kept.
+
+    The sender has to send the whole header at once, it is peeked with
+    a single read bounded by ``timeout`` and only the header is then
+    consumed, the data following it is left to the handler. A missing,
+    partial or malformed header raises :class:`ProxyProtocolError`.
+    """
+    previous = sock.gettimeout()
+    sock.settimeout(timeout)
+    try:
+        data = sock.recv(MAX_HEADER_SIZE, socket.MSG_PEEK)
+    except socket.timeout:
+        raise ProxyProtocolError("No PROXY protocol header after %ss" % timeout)
+    finally:
+        sock.settimeout(previous)
+
+    if not data:
+        raise ProxyProtocolError("Connection closed before the PROXY protocol header")
+    if data.startswith(V2_SIGNATURE):
+        size, address = parse_v2(data)
+    elif data.startswith(V1_PREFIX):
+        size, address = parse_v1(data)
+    elif V2_SIGNATURE.startswith(data) or V1_PREFIX.startswith(data):
+        raise ProxyProtocolError("Partial PROXY protocol header")
+    else:
+        raise ProxyProtocolError("Missing PROXY protocol header")
+
+    # consume the header, it is already in the receive buffer
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ProxyProtocolError("Connection closed in the PROXY protocol header")
+        size -= len(chunk)
+    return address
+
+
+def parse_v1(data):
+    """Parse a v1 header, return its size and the client address"""
+    end = data.find(b'\r\n', 0, V1_MAX_SIZE)
+    if end == -1:
+        if len(data) < V1_MAX_SIZE:
+            raise ProxyProtocolError("Partial PROXY protocol header")
+        raise ProxyProtocolError("PROXY protocol v1 header too long")
+
+    fields = data[:end].split(b' ')
+    # UNKNOWN may be followed by anything up to CRLF
+    if fields[1:2] == [b'UNKNOWN']:
+        return end + 2, None
+    if len(fields) != 6 or fields[1] not in (b'TCP4', b'TCP6'):
+        raise ProxyProtocolError("Invalid PROXY protocol v1 header: %r" % data[:end])
+
+    family = socket.AF_INET if fields[1] == b'TCP4' else socket.AF_INET6
+    try:
+        # the native string type, like the addresses of the sockets
+        host = str(fields[2].decode('ascii'))
+        socket.inet_pton(family, host)
+        port = int(fields[4])
+    except (socket.error, ValueError):
+        raise ProxyProtocolError("Invalid PROXY protocol v1 address: %r" % data[:end])
+    if not 0 <= port <= 65535:
+        raise ProxyProtocolError("Invalid PROXY protocol v1 port: %r" % fields[4])
+    return end + 2, (host, port)
+
+
+def parse_v2(data):
+    """Parse a v2 header, return its size and the client address"""
+    if len(data) < V2_HEADER.size:
+        raise ProxyProtocolError("Partial PROXY protocol header")
+
+    _, version_command, family, length = V2_HEADER.unpack_from(data)
+    size = V2_HEADER.size + length
+    if version_command >> 4 != 2:
+        raise ProxyProtocolError("Unsupported PROXY protocol version %s" % (version_command >> 4))
+    if size > MAX_HEADER_SIZE:
+        raise ProxyProtocolError("PROXY protocol v2 header too long (%s bytes)" % size)
+    if len(data) < size:
+        raise ProxyProtocolError("Partial PROXY protocol header")
+
+    command = version_command & 0xf
+    if command == V2_CMD_LOCAL:
+        return size, None
+    if command != V2_CMD_PROXY:
+        raise ProxyProtocolError("Unsupported PROXY protocol v2 command %s" % command)
+
+    if family not in V2_ADDRESSES:
+        # unix sockets and unspecified families keep the real address
+        return size, None
+
+    family, block = V2_ADDRESSES[family]
+    if length < block.size:
+        raise ProxyProtocolError("Truncated PROXY protocol v2 addresses")
+    src, _, src_port, _ = block.unpack_from(data, V2_HEADER.size)
+    return size, (socket.inet_ntop(family, src), src_port)
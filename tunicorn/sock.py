@@ -3,10 +3,13 @@
 # This file is part of gunicorn released under the MIT license.
 # See the NOTICE for more information.
 
+import ctypes
 import errno
 import os
 import socket
+import ssl
 import stat
+import struct
 import sys
 import time
 
@@ -16,13 +19,47 @@ from . import util
 
 SD_LISTEN_FDS_START = 3
 
+# tuning settings of the TCP listeners: (setting, level, option), the
+# accepted connections inherit them from the listener
+TCP_OPTIONS = [
+    ('SO_RCVBUF', socket.SOL_SOCKET, socket.SO_RCVBUF),
+    ('SO_SNDBUF', socket.SOL_SOCKET, socket.SO_SNDBUF),
+    ('SO_KEEPALIVE', socket.SOL_SOCKET, socket.SO_KEEPALIVE),
+    ('TCP_KEEPIDLE', socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPIDLE', 4)),
+    ('TCP_KEEPINTVL', socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPINTVL', 5)),
+    ('TCP_KEEPCNT', socket.IPPROTO_TCP, getattr(socket, 'TCP_KEEPCNT', 6)),
+    ('TCP_USER_TIMEOUT', socket.IPPROTO_TCP, getattr(socket, 'TCP_USER_TIMEOUT', 18)),
+    ('TCP_DEFER_ACCEPT', socket.IPPROTO_TCP, getattr(socket, 'TCP_DEFER_ACCEPT', 9)),
+    ('TCP_FASTOPEN', socket.IPPROTO_TCP, getattr(socket, 'TCP_FASTOPEN', 23)),
+]
+
+# the settings of a BIND entry applied when binding its socket
+SOCKET_SETTINGS = ('BACKLOG', 'UMASK', 'REUSE_PORT') + tuple(option[0] for option in TCP_OPTIONS)
+
+SO_ACCEPTCONN = getattr(socket, 'SO_ACCEPTCONN', 30)
+SO_ATTACH_REUSEPORT_CBPF = getattr(socket, 'SO_ATTACH_REUSEPORT_CBPF', 51)
+SO_DETACH_REUSEPORT_BPF = getattr(socket, 'SO_DETACH_REUSEPORT_BPF', 68)
+
+# classic BPF program returning the cpu that received the connection:
+# ``ld #cpu; ret a``, see filter(2) and socket(7)
+BPF_LD_W_ABS = 0x20
+BPF_RET_A = 0x16
+SKF_AD_CPU = (-0x1000 + 36) & 0xffffffff
+REUSEPORT_CPU_PROGRAM = [(BPF_LD_W_ABS, 0, 0, SKF_AD_CPU),
+                         (BPF_RET_A, 0, 0, 0)]
+
 
 class BaseSocket(object):
-    def __init__(self, address, conf, log, fd=None):
+    def __init__(self, address, conf, log, fd=None, reuse_port=False):
         self.log = log
         self.conf = conf
 
         self.cfg_addr = address
+        # effective values of the TCP_OPTIONS set on the socket
+        self.tuning = {}
+        # the socket only holds the address, every worker listens on its
+        # own SO_REUSEPORT socket, see create_worker_sockets()
+        self.reuse_port = reuse_port
         if fd is None:
             sock = socket.socket(self.FAMILY, socket.SOCK_STREAM)
             bound = False
@@ -41,8 +78,6 @@ class BaseSocket(object):
 
     def set_options(self, sock, bound=False):
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        if hasattr(socket, 'SO_REUSEPORT'):
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         if not bound:
             self.bind(sock)
         sock.setblocking(0)
@@ -51,7 +86,8 @@ class BaseSocket(object):
         if hasattr(sock, "set_inheritable"):
             sock.set_inheritable(True)
 
-        sock.listen(self.conf.BACKLOG)
+        if not self.reuse_port:
+            sock.listen(self.conf.BACKLOG)
         return sock
 
     def bind(self, sock):
@@ -73,7 +109,7 @@ class TCPSocket(BaseSocket):
     FAMILY = socket.AF_INET
 
     def __str__(self):
-        if self.conf.is_ssl:
+        if self.conf.CERTFILE:
             scheme = "https"
         else:
             scheme = "http"
@@ -83,8 +119,27 @@ class TCPSocket(BaseSocket):
 
     def set_options(self, sock, bound=False):
         sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # unix sockets don't support SO_REUSEPORT
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.set_tuning(sock)
         return super(TCPSocket, self).set_options(sock, bound=bound)
 
+    def set_tuning(self, sock):
+        """Apply the TCP_OPTIONS of the configuration, before binding
+        and listening since the buffer sizes and TCP_FASTOPEN must be set
+        by then, and read back the values the kernel applied."""
+        for name, level, option in TCP_OPTIONS:
+            value = self.conf[name]
+            if not value:
+                continue
+            try:
+                sock.setsockopt(level, option, int(value))
+            except socket.error as e:
+                self.log.error("Unable to set %s to %r on %s: %s", name, value, self.cfg_addr, e)
+                raise
+            self.tuning[name] = sock.getsockopt(level, option)
+
 
 class TCP6Socket(TCPSocket):
     FAMILY = socket.AF_INET6
@@ -97,7 +152,7 @@ class TCP6Socket(TCPSocket):
 class UnixSocket(BaseSocket):
     FAMILY = socket.AF_UNIX
 
-    def __init__(self, addr, conf, log, fd=None):
+    def __init__(self, addr, conf, log, fd=None, reuse_port=False):
         if fd is None:
             try:
                 st = os.stat(addr)
@@ -109,6 +164,7 @@ class UnixSocket(BaseSocket):
                     os.remove(addr)
                 else:
                     raise ValueError("%r is not a socket" % addr)
+        # the kernel doesn't balance unix sockets, they are always shared
         super(UnixSocket, self).__init__(addr, conf, log, fd=fd)
 
     def __str__(self):
@@ -125,6 +181,91 @@ class UnixSocket(BaseSocket):
         super(UnixSocket, self).close()
 
 
+def tcp_fastopen_server():
+    try:
+        with open('/proc/sys/net/ipv4/tcp_fastopen') as f:
+            return bool(int(f.read()) & 0x2)
+    except (IOError, OSError, ValueError):
+        return True
+
+
+def log_tuning(sock, log):
+    """Log the TCP_OPTIONS applied to a listener and the ones the
+    kernel didn't apply as configured."""
+    if not sock.tuning:
+        return
+
+    log.info("Socket options of %s: %s", str(sock.cfg_addr),
+             ", ".join(["%s=%s" % (name, sock.tuning[name]) for name, _, _ in TCP_OPTIONS
+                        if name in sock.tuning]))
+
+    # the kernel doubles the buffer sizes and caps them to
+    # net.core.rmem_max and wmem_max
+    for name in ('SO_RCVBUF', 'SO_SNDBUF'):
+        if name in sock.tuning and sock.tuning[name] < 2 * sock.conf[name]:
+            log.warning("%s of %s capped to %s by the kernel", name,
+                        str(sock.cfg_addr), sock.tuning[name] // 2)
+
+    if sock.tuning.get('TCP_FASTOPEN') and not tcp_fastopen_server():
+        log.warning("TCP_FASTOPEN of %s is set but the server side is disabled "
+                    "in net.ipv4.tcp_fastopen", str(sock.cfg_addr))
+
+
+def create_ssl_context(conf):
+    """
+    Build the TLS context of a listener from CERTFILE, KEYFILE,
+    SSL_CIPHERS and SSL_ALPN_PROTOCOLS, ``None`` without CERTFILE.
+
+    The context is built by the arbiter, before forking, so all the
+    workers share its session ticket keys and a client can resume its
+    session on any worker. A new context gets new keys, see
+    ``Arbiter.rotate_ssl_contexts``.
+    """
+    if not conf.CERTFILE:
+        return None
+
+    context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+    context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+    context.options &= ~getattr(ssl, 'OP_NO_TICKET', 0)
+    context.load_cert_chain(conf.CERTFILE, conf.KEYFILE)
+    if conf.SSL_CIPHERS:
+        context.set_ciphers(conf.SSL_CIPHERS)
+    if conf.SSL_ALPN_PROTOCOLS:
+        context.set_alpn_protocols(conf.SSL_ALPN_PROTOCOLS)
+    return context
+
+
+def check_socket_settings(conf):
+    """Validate the TCP_OPTIONS of a listener configuration, the values
+    are numbers of bytes, seconds, probes or milliseconds for
+    TCP_USER_TIMEOUT."""
+    for name, _, _ in TCP_OPTIONS:
+        value = conf[name]
+        if value is None or isinstance(value, bool):
+            continue
+        if not isinstance(value, int) or value < 0:
+            raise RuntimeError("%s must be a positive integer, got %r" % (name, value))
+
+
+def listen_fds(unset_environment=True):
+    """
+    Return the number of sockets passed by systemd socket
+    activation, starting at SD_LISTEN_FDS_START. See
+    sd_listen_fds(3).
+    """
+    fds = int(os.environ.get('LISTEN_FDS', 0))
+    listen_pid = int(os.environ.get('LISTEN_PID', 0))
+
+    if listen_pid != os.getpid():
+        return 0
+
+    if unset_environment:
+        os.environ.pop('LISTEN_PID', None)
+        os.environ.pop('LISTEN_FDS', None)
+
+    return fds
+
+
 def _sock_type(addr):
     if isinstance(addr, tuple):
         if util.is_ipv6(addr[0]):
@@ -138,27 +279,51 @@ def _sock_type(addr):
     return sock_type
 
 
-def create_sockets(conf, log):
+def create_sockets(conf, log, fds=None):
     """
     Create a new socket for the given address. If the
     address is a tuple, a TCP socket is created. If it
     is a string, a Unix socket is created. Otherwise
     a TypeError is raised.
+
+    Every socket gets the configuration of its entry of ``BIND``, see
+    ``Application.listener_configs``.
+
+    When ``fds`` is given the listeners are adopted from these
+    already bound file descriptors instead, e.g. the ones passed
+    down by the old master through ``TUNICORN_FD``.
     """
     # get it only once
     listeners = []
-    laddr = conf.ADDRESS
+
+    # sockets are already bound
+    if fds is not None:
+        for fd in fds:
+            sock = socket.fromfd(fd, socket.AF_UNIX, socket.SOCK_STREAM)
+            sock_name = sock.getsockname()
+            listening = sock.getsockopt(socket.SOL_SOCKET, SO_ACCEPTCONN)
+            sock.close()
+            sock_type = _sock_type(sock_name)
+            sock_conf = listener_conf(conf, sock_name)
+            # a listening socket can't be turned back into a reservation,
+            # the workers have to share it
+            reuse_port = sock_conf.REUSE_PORT and not listening
+            if sock_conf.REUSE_PORT and listening and sock_type is not UnixSocket:
+                log.warning("REUSE_PORT disabled for %s, the inherited socket is "
+                            "already listening", str(sock_name))
+            sock = sock_type(sock_name, sock_conf, log, fd=fd, reuse_port=reuse_port)
+            log_tuning(sock, log)
+            listeners.append(sock)
+        return listeners
 
     # no sockets is bound, first initialization of gunicorn in this env.
-    for addr in laddr:
+    for sock_conf in conf.LISTENERS:
+        addr = sock_conf.ADDRESS
         sock_type = _sock_type(addr)
-        # If we fail to create a socket from GUNICORN_FD
-        # we fall through and try and open the socket
-        # normally.
         sock = None
         for i in range(5):
             try:
-                sock = sock_type(addr, conf, log)
+                sock = sock_type(addr, sock_conf, log, reuse_port=sock_conf.REUSE_PORT)
             except socket.error as e:
                 if e.args[0] == errno.EADDRINUSE:
                     log.error("Connection in use: %s", str(addr))
@@ -176,6 +341,81 @@ def create_sockets(conf, log):
             log.error("Can't connect to %s", str(addr))
             sys.exit(1)
 
+        log_tuning(sock, log)
         listeners.append(sock)
 
     return listeners
+
+
+def listener_conf(conf, sock_name):
+    """Find the ``BIND`` entry of an inherited socket, TCP sockets are
+    matched on their port since the host may be a name. The sockets
+    without an entry get the global configuration, and its TLS context.
+    """
+    for sock_conf in conf.LISTENERS:
+        if sock_conf.ADDRESS == sock_name:
+            return sock_conf
+    # an exact match wins over an earlier entry on the same port
+    if isinstance(sock_name, tuple):
+        for sock_conf in conf.LISTENERS:
+            addr = sock_conf.ADDRESS
+            if isinstance(addr, tuple) and addr[1] == sock_name[1]:
+                return sock_conf
+    if conf.SSL_CONTEXT is None:
+        conf.SSL_CONTEXT = create_ssl_context(conf)
+    return conf
+
+
+def listener_settings(conf):
+    """The settings the listeners are bound with, the listeners are
+    opened again when they change on reload."""
+    return [(sock_conf.ADDRESS,) + tuple(sock_conf[name] for name in SOCKET_SETTINGS)
+            for sock_conf in conf.LISTENERS]
+
+
+def create_worker_sockets(listeners, log):
+    """
+    Open the sockets a worker accepts on. Every listener of the
+    arbiter bound with ``reuse_port`` is replaced by a new SO_REUSEPORT
+    socket bound to the same address, the kernel then spreads the
+    connections between the workers. The other listeners are shared.
+
+    It must be called before the worker drops its privileges, the
+    sockets of a SO_REUSEPORT group must belong to the same user.
+    """
+    sockets = []
+    for listener in listeners:
+        if not listener.reuse_port:
+            sockets.append(listener)
+            continue
+
+        sock = type(listener)(listener.getsockname(), listener.conf, log)
+        if listener.conf.REUSE_PORT_CBPF:
+            try:
+                attach_reuseport_cbpf(sock.sock)
+            except socket.error as e:
+                log.warning("Unable to attach the REUSE_PORT_CBPF program: %s", e)
+        else:
+            # the program outlives the workers which attached it as long
+            # as the group has a socket, e.g. during a rolling reload
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_REUSEPORT_BPF, 0)
+            except socket.error:
+                pass
+        listener.close()
+        sockets.append(sock)
+
+    return sockets
+
+
+def attach_reuseport_cbpf(sock):
+    """
+    Steer the connections of the SO_REUSEPORT group of ``sock`` by cpu,
+    a connection goes to the socket whose index in the group is the
+    cpu that received it. The kernel falls back to the hash of the
+    connection when the group has fewer sockets than cpus.
+    """
+    code = b''.join([struct.pack('HBBI', *insn) for insn in REUSEPORT_CPU_PROGRAM])
+    filters = ctypes.create_string_buffer(code, len(code))
+    fprog = struct.pack('HP', len(REUSEPORT_CPU_PROGRAM), ctypes.addressof(filters))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_REUSEPORT_CBPF, fprog)
@@ -1,8 +1,11 @@
+import binascii
 import errno
+import glob
 import logging
 import os
 import random
 import socket
+import struct
 import sys
 import time
 import traceback
@@ -10,6 +13,8 @@ import traceback
 import fcntl
 import pwd
 
+from six import string_types
+
 REDIRECT_TO = getattr(os, 'devnull', '/dev/null')
 
 from .exceptions import AppImportException
@@ -144,6 +149,259 @@ def import_app(module):
     return app
 
 
+def memory_info():
+    """Return the resident (``rss``) and unique (``uss``) set size of the
+    current process in bytes. ``uss`` is ``None`` when the kernel doesn't
+    provide ``/proc/self/smaps_rollup``.
+    """
+    info = {'rss': None, 'uss': None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            uss = 0
+            for line in f:
+                fields = line.split()
+                if fields[0] == 'Rss:':
+                    info['rss'] = int(fields[1]) * 1024
+                elif fields[0] in ('Private_Clean:', 'Private_Dirty:'):
+                    uss += int(fields[1]) * 1024
+            info['uss'] = uss
+    except (IOError, OSError):
+        try:
+            with open('/proc/self/statm') as f:
+                info['rss'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (IOError, OSError):
+            pass
+    return info
+
+
+def parse_cpu_list(text):
+    """Parse a kernel cpu list such as ``0-3,8,10-11``"""
+    cpus = set()
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def get_cpu_affinity():
+    """Return the set of cpus the current process is allowed to run on,
+    this is already restricted by the cpuset of the cgroup.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return set(os.sched_getaffinity(0))
+
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('Cpus_allowed_list:'):
+                return parse_cpu_list(line.split(':', 1)[1])
+    raise RuntimeError("Unable to read the cpu affinity")
+
+
+def set_cpu_affinity(cpus):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+        return
+
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    bits = ctypes.sizeof(ctypes.c_ulong) * 8
+    mask = (ctypes.c_ulong * (1024 // bits))()
+    for cpu in cpus:
+        mask[cpu // bits] |= 1 << (cpu % bits)
+    if libc.sched_setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+def check_cpu_affinity(affinity):
+    """Validate ``WORKER_CPU_AFFINITY``: ``None``, ``'core'``, ``'numa'`` or
+    a list of cpus or cpu sets."""
+    if affinity is None or affinity in ('core', 'numa'):
+        return
+    if isinstance(affinity, string_types) or not isinstance(affinity, (list, tuple)) or not affinity:
+        raise RuntimeError("WORKER_CPU_AFFINITY must be 'core', 'numa' or a list of cpu sets, "
+                           "got %r" % (affinity,))
+    for cpus in affinity:
+        if isinstance(cpus, int) and not isinstance(cpus, bool):
+            cpus = [cpus]
+        if (not isinstance(cpus, (list, tuple, set)) or not cpus or
+                not all(isinstance(c, int) and not isinstance(c, bool) and c >= 0 for c in cpus)):
+            raise RuntimeError("Invalid cpu set %r in WORKER_CPU_AFFINITY" % (cpus,))
+
+
+def numa_nodes():
+    """Return the cpu sets of the NUMA nodes, ordered by node"""
+    nodes = []
+    for name in sorted(glob.glob('/sys/devices/system/node/node[0-9]*'),
+                       key=lambda n: int(n.rsplit('node', 1)[1])):
+        with open(os.path.join(name, 'cpulist')) as f:
+            nodes.append(parse_cpu_list(f.read()))
+    return nodes
+
+
+def cpu_sets(affinity):
+    """Return the cpu sets the workers are pinned to for the
+    ``WORKER_CPU_AFFINITY`` setting, restricted to the allowed cpus:
+
+    - ``'core'``: one set per allowed cpu
+    - ``'numa'``: the allowed cpus of each NUMA node
+    - a list of cpu sets, e.g. ``[[0, 1], [2, 3]]``
+    """
+    allowed = get_cpu_affinity()
+    if affinity == 'core':
+        return [set([cpu]) for cpu in sorted(allowed)]
+    if affinity == 'numa':
+        nodes = [node & allowed for node in numa_nodes()]
+        return [node for node in nodes if node] or [allowed]
+
+    sets = []
+    for cpus in affinity:
+        if isinstance(cpus, int):
+            cpus = [cpus]
+        cpus = set(cpus) & allowed
+        if cpus:
+            sets.append(cpus)
+    return sets
+
+
+def _proc_address(text):
+    """Decode an ``address:port`` of ``/proc/net/tcp`` or ``tcp6``, the
+    address is printed as 32-bit words in host byte order."""
+    address, port = text.split(':')
+    raw = binascii.unhexlify(address)
+    if sys.byteorder == 'little':
+        raw = b''.join([raw[i:i + 4][::-1] for i in range(0, len(raw), 4)])
+    family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, raw), int(port, 16)
+
+
+# sock_diag netlink protocol, see linux/sock_diag.h and linux/inet_diag.h
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+TCP_LISTEN = 10
+NLMSG_HEADER = struct.Struct('=IHHII')
+# family, protocol, extensions, pad, states, then an empty socket id
+INET_DIAG_REQ = struct.Struct('=BBBxI48x')
+# family, state, timer, retrans, sport, dport, src, dst, if, cookie,
+# expires, rqueue, wqueue, uid, inode
+INET_DIAG_MSG = struct.Struct('=BBBB2s2s16s16sI8sIIIII')
+
+
+def listen_queues():
+    """Return the listening TCP sockets of the host as a list of
+    ``((address, port), queued)``, ``queued`` being the number of
+    established connections waiting in their accept queue.
+
+    The kernel is asked for the listening sockets only with sock_diag,
+    ``/proc/net/tcp`` and ``tcp6`` are read when it isn't available.
+    """
+    try:
+        return _diag_listen_queues()
+    except (socket.error, OSError, AttributeError):
+        return _proc_listen_queues()
+
+
+def _diag_listen_queues():
+    queues = []
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+    try:
+        for seq, family in enumerate((socket.AF_INET, socket.AF_INET6)):
+            request = INET_DIAG_REQ.pack(family, socket.IPPROTO_TCP, 0, 1 << TCP_LISTEN)
+            sock.sendall(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY,
+                                           NLM_F_REQUEST | NLM_F_DUMP, seq + 1, 0) + request)
+            done = False
+            while not done:
+                data = sock.recv(65536)
+                offset = 0
+                while offset + NLMSG_HEADER.size <= len(data):
+                    length, kind = NLMSG_HEADER.unpack_from(data, offset)[:2]
+                    if kind == NLMSG_DONE:
+                        done = True
+                        break
+                    if kind == NLMSG_ERROR:
+                        raise OSError("sock_diag request failed")
+                    (family_, _, _, _, sport, _, src, _, _, _, _, rqueue,
+                     _, _, _) = INET_DIAG_MSG.unpack_from(data, offset + NLMSG_HEADER.size)
+                    size = 4 if family_ == socket.AF_INET else 16
+                    address = socket.inet_ntop(family_, src[:size])
+                    # rqueue holds the accept queue of a listener
+                    queues.append(((address, struct.unpack('!H', sport)[0]), rqueue))
+                    # the messages are aligned on 4 bytes
+                    offset += (length + 3) & ~3
+                if not data:
+                    break
+    finally:
+        sock.close()
+    return queues
+
+
+def _proc_listen_queues():
+    queues = []
+    for name in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            f = open(name)
+        except (IOError, OSError):
+            continue
+        with f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                # 0A is TCP_LISTEN, the listening sockets are listed
+                # first, rx_queue holds their accept queue
+                if fields[3] != '0A':
+                    break
+                queued = fields[4].split(':')[1]
+                queues.append((_proc_address(fields[1]), int(queued, 16)))
+    return queues
+
+
+def tcp_ext_stats():
+    """Return the ``TcpExt`` counters of ``/proc/net/netstat``, e.g.
+    ``ListenOverflows`` and ``ListenDrops``."""
+    stats = {}
+    try:
+        with open('/proc/net/netstat') as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return stats
+    for header, values in zip(lines[::2], lines[1::2]):
+        if header.startswith('TcpExt:'):
+            stats.update(zip(header.split()[1:], [int(v) for v in values.split()[1:]]))
+    return stats
+
+
+def somaxconn():
+    """Return ``net.core.somaxconn``, the kernel caps the backlog of
+    every listener to it, ``None`` when it can't be read."""
+    try:
+        with open('/proc/sys/net/core/somaxconn') as f:
+            return int(f.read())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def unload_app(module):
+    """Remove an application module and its submodules from ``sys.modules``,
+    the next :func:`import_app` will then import the code on disk again.
+    The parent packages, which may be shared with other code, are kept.
+    """
+    module = module.split(':', 1)[0]
+    for name in list(sys.modules.keys()):
+        if name == module or name.startswith(module + '.'):
+            del sys.modules[name]
+
+
 def unlink(name):
     try:
         os.unlink(name)
@@ -1,9 +1,20 @@
 from .base import Worker
-from .ggevent import GeventWorker
+from .sync import SyncWorker
 
 
 def choose_worker(worker_class):
     if worker_class == 'gevent':
+        from .ggevent import GeventWorker
         return GeventWorker
+    elif worker_class == 'sync':
+        return SyncWorker
+    elif worker_class == 'gthread':
+        # needs the futures and selectors2 backports on python 2
+        from .gthread import ThreadWorker
+        return ThreadWorker
+    elif worker_class == 'asyncio':
+        # python 3 only
+        from .gasyncio import AsyncioWorker
+        return AsyncioWorker
     else:
         return None
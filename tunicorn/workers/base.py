@@ -1,31 +1,62 @@
 import os
+import random
 import signal
+import socket
+import ssl
 import sys
 import time
 
+from tunicorn.connection import BufferPool
+from tunicorn.connection import BufferedConnection
+from tunicorn.deadlines import DeadlineSocket
+from tunicorn.deadlines import TimeoutSocket
+from tunicorn.exceptions import DeadlineExpired
+from tunicorn.exceptions import FramingError
+from tunicorn.exceptions import ProxyProtocolError
+from tunicorn.proxy_protocol import read_proxy_header
 from tunicorn.signaler import Signaler
+from tunicorn.sock import create_worker_sockets
+from tunicorn.util import memory_info
 from tunicorn.util import seed
+from tunicorn.util import set_cpu_affinity
 from tunicorn.util import set_owner_process
-from .workertmp import WorkerTmp
 
 
 class Worker(Signaler):
-    def __init__(self, age, parent_pid, sockets, app, timeout, logger=None):
+    def __init__(self, age, parent_pid, sockets, app, timeout, logger=None, slot=None,
+                 cpus=None):
         super(Worker, self).__init__()
         self.logger = logger or app.logger
         self.age = age
         self.parent_id = parent_pid
         self.sockets = sockets
+        self.listeners = sockets
         self.app = app
         self.config = self.app.config
         self.timeout = timeout
 
         self.handler = None
+        self.handlers = []
         self.booted = False
         self.aborted = False
+        self.retired = False
+        self.boot_started = time.time()
         self.alive = True
-        self.tmp = WorkerTmp(self.config)
+        self.slot = slot
+        # the cpus assigned by the arbiter for WORKER_CPU_AFFINITY
+        self.cpus = cpus
         self.worker_connections = self.config.WORKER_CONNECTIONS
+        self.max_requests = sys.maxsize
+        self.memory_checked = 0
+        # the TimerWheel of the workers enforcing the deadlines
+        self.deadlines = None
+        self.buffers = BufferPool(self.config.BUFFER_SIZE)
+
+    @classmethod
+    def capacity(cls, config):
+        """The connections a worker runs at once, the autoscaling compares
+        the active ones against it"""
+        return config.WORKER_CONNECTIONS
 
     # --------------------------------------------------
     # signals handlers
@@ -75,6 +106,7 @@ class Worker(Signaler):
     # --------------------------------------------------
 
     def init_process(self):
+        self.slot.pid = self.pid
 
         # set environment
         if self.config.ENV:
@@ -84,12 +116,51 @@ class Worker(Signaler):
 
         seed()
 
+        if self.cpus:
+            self.set_cpu_affinity()
+
+        if self.config.MAX_REQUESTS:
+            # the jitter keeps the workers from all being recycled at once
+            jitter = random.randint(0, self.config.MAX_REQUESTS_JITTER or 0)
+            self.max_requests = self.config.MAX_REQUESTS + jitter
+
         self.init_signals()
 
         self.load_handler()
         self.booted = True
+
+        boot_time = time.time() - self.boot_started
+        memory = memory_info()
+        self.logger.info("Worker booted in %.3fs (rss: %s, uss: %s)",
+                         boot_time, memory['rss'], memory['uss'],
+                         extra={"metric": "tunicorn.worker.boot_time",
+                                "value": boot_time,
+                                "mtype": "histogram"})
         self.run()
 
+    def init_sockets(self):
+        """\
+        Open the per-worker listeners in ``REUSE_PORT`` mode. Subclasses
+        call it at the start of :meth:`init_process`, before wrapping the
+        sockets and dropping the privileges. ``self.listeners`` keeps the
+        listeners in the order of ``self.sockets``.
+        """
+        self.sockets = create_worker_sockets(self.sockets, self.logger)
+        self.listeners = list(self.sockets)
+
+    def set_cpu_affinity(self):
+        """\
+        Pin the worker to the cpus the arbiter assigned to it, see
+        :meth:`tunicorn.arbiter.Arbiter.assign_cpus`.
+        """
+        try:
+            set_cpu_affinity(self.cpus)
+        except (OSError, IOError) as e:
+            self.logger.warning("Unable to set the cpu affinity: %s", e)
+            return
+
+        self.logger.info("Worker pinned to cpus %s", ','.join([str(c) for c in sorted(self.cpus)]))
+
     def run(self):
         """\
         This is the mainloop of a worker process. You should override
@@ -101,6 +172,7 @@ class Worker(Signaler):
     def load_handler(self):
         try:
             self.handler = self.app.handler
+            self.handlers = [self.app.get_handler(l.conf.APP) for l in self.listeners]
         except SystemError as e:
             self.logger.exception(e)
 
@@ -123,4 +195,100 @@ class Worker(Signaler):
         once every ``self.timeout`` seconds. If you fail in accomplishing
         this task, the master process will murder your workers.
         """
-        self.tmp.notify()
+        if time.time() - self.memory_checked >= self.config.MEMORY_CHECK_INTERVAL:
+            self.check_memory()
+        self.slot.notify()
+
+    def check_memory(self):
+        """\
+        Publish the memory usage of the worker in its scoreboard slot and
+        ask for a replacement once it grows above ``MAX_WORKER_RSS``.
+        """
+        self.memory_checked = time.time()
+        memory = memory_info()
+        self.slot.rss = memory['rss'] or 0
+        self.slot.uss = memory['uss'] or 0
+
+        limit = self.config.MAX_WORKER_RSS
+        if limit and self.slot.rss > limit and not self.slot.recycle:
+            self.logger.warning("Worker rss %s above MAX_WORKER_RSS %s, waiting for a replacement (pid:%s)",
+                                self.slot.rss, limit, self.pid)
+            self.slot.request_recycle()
+
+    def init_connection(self, client, address, conf):
+        """\
+        Read the PROXY protocol header of the connection, its address is
+        replaced by the one of the client, and do the TLS handshake,
+        in this order since the load balancer doesn't terminate TLS.
+        The handshake is bounded by ``IDLE_TIMEOUT``, or ``READ_TIMEOUT``.
+        Return ``(None, None)`` once the connection has been dropped.
+        """
+        try:
+            if conf.PROXY_PROTOCOL:
+                address = read_proxy_header(client, conf.PROXY_PROTOCOL_TIMEOUT) or address
+            if conf.SSL_CONTEXT is not None:
+                timeout = conf.IDLE_TIMEOUT or conf.READ_TIMEOUT
+                previous = client.gettimeout()
+                if timeout:
+                    client.settimeout(timeout)
+                client = conf.SSL_CONTEXT.wrap_socket(client, server_side=True)
+                client.settimeout(previous)
+        except (ProxyProtocolError, ssl.SSLError, socket.error) as e:
+            self.logger.debug("Dropping connection from %s: %s", address, e)
+            client.close()
+            return None, None
+        return client, address
+
+    def handle(self, listener, client, address, handler=None, conf=None):
+        """\
+        Run the handler for an accepted connection and account for it
+        in the scoreboard slot of the worker. ``handler`` is the
+        application of the listener, the main one by default, and
+        ``conf`` its configuration, see :meth:`init_connection`. The
+        handler gets a :class:`DeadlineSocket` enforcing the timeouts of
+        the listener, a :class:`TimeoutSocket` for the workers without a
+        timer wheel, wrapped in a :class:`BufferedConnection` with
+        ``BUFFERED_CONNECTION``.
+        """
+        self.slot.start_request()
+        connection = client
+        try:
+            if conf is not None:
+                connection, address = self.init_connection(client, address, conf)
+                if connection is None:
+                    return
+                if conf.IDLE_TIMEOUT or conf.READ_TIMEOUT or conf.WRITE_TIMEOUT:
+                    if self.deadlines is not None:
+                        connection = DeadlineSocket(connection, self.deadlines, conf, time.time,
+                                                    self.connection_expired)
+                    else:
+                        connection = TimeoutSocket(connection, conf, self.connection_expired)
+                if conf.BUFFERED_CONNECTION:
+                    connection = BufferedConnection(connection, self.buffers)
+            (handler or self.handler)(listener, connection, address)
+        except (DeadlineExpired, FramingError) as e:
+            self.logger.debug("Closing connection from %s: %s", address, e)
+        finally:
+            # the worker closes the accepted socket, not the TLS one
+            try:
+                if connection is not None and connection is not client:
+                    connection.close()
+            except socket.error as e:
+                # e.g. the writes a buffered connection still had to send
+                self.logger.debug("Error closing connection from %s: %s", address, e)
+            finally:
+                self.finish_request()
+
+    def connection_expired(self, kind):
+        self.slot.count_timeout()
+
+    def finish_request(self):
+        """\
+        Account for a finished connection and ask for a replacement once
+        the worker has handled ``MAX_REQUESTS`` of them.
+        """
+        self.slot.finish_request()
+        if self.slot.requests >= self.max_requests and not self.slot.recycle:
+            self.logger.info("Max requests reached, waiting for a replacement (pid:%s)",
+                             self.pid)
+            self.slot.request_recycle()
@@ -0,0 +1,304 @@
+import asyncio
+import inspect
+import os
+from functools import partial
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from tunicorn.exceptions import DeadlineExpired
+from tunicorn.exceptions import ProxyProtocolError
+from tunicorn.proxy_protocol import MAX_HEADER_SIZE
+from tunicorn.proxy_protocol import V1_PREFIX
+from tunicorn.proxy_protocol import V2_HEADER
+from tunicorn.proxy_protocol import V2_SIGNATURE
+from tunicorn.proxy_protocol import parse_v1
+from tunicorn.proxy_protocol import parse_v2
+from .base import Worker
+
+# a heartbeat later than this is reported as a blocked event loop
+LOOP_LAG_WARNING = 0.1
+
+
+class DeadlineStreams(object):
+    """\
+    Reader and writer of a connection enforcing the deadlines of its
+    listener with ``asyncio.wait_for``, like
+    :class:`tunicorn.deadlines.DeadlineSocket`: ``IDLE_TIMEOUT`` for
+    the first read and the reads following a write, ``READ_TIMEOUT``
+    for the other reads and ``WRITE_TIMEOUT`` for ``drain``. Once a
+    deadline expires the connection is closed and the calls raise
+    :class:`DeadlineExpired`.
+    """
+
+    def __init__(self, reader, writer, conf, on_expire=None):
+        self._writer = writer
+        self._on_expire = on_expire
+        self.idle_timeout = conf.IDLE_TIMEOUT
+        self.read_timeout = conf.READ_TIMEOUT
+        self.write_timeout = conf.WRITE_TIMEOUT
+        self.idle = True
+        self.expired = None
+        self.reader = DeadlineReader(reader, self)
+        self.writer = DeadlineWriter(writer, self)
+
+    async def read(self, awaitable):
+        kind = 'idle' if self.idle else 'read'
+        result = await self.call(kind, self.idle_timeout if self.idle else self.read_timeout,
+                                 awaitable)
+        self.idle = False
+        return result
+
+    async def write(self, awaitable):
+        return await self.call('write', self.write_timeout, awaitable)
+
+    async def call(self, kind, timeout, awaitable):
+        if self.expired:
+            awaitable.close()
+            raise DeadlineExpired("%s timeout" % self.expired)
+        if not timeout:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.expired = kind
+            self._writer.close()
+            if self._on_expire is not None:
+                self._on_expire(kind)
+            raise DeadlineExpired("%s timeout" % kind)
+
+
+class DeadlineReader(object):
+    """``StreamReader`` of :class:`DeadlineStreams`"""
+
+    def __init__(self, reader, streams):
+        self._reader = reader
+        self._streams = streams
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+    def read(self, n=-1):
+        return self._streams.read(self._reader.read(n))
+
+    def readline(self):
+        return self._streams.read(self._reader.readline())
+
+    def readexactly(self, n):
+        return self._streams.read(self._reader.readexactly(n))
+
+    def readuntil(self, separator=b'\n'):
+        return self._streams.read(self._reader.readuntil(separator))
+
+
+class DeadlineWriter(object):
+    """``StreamWriter`` of :class:`DeadlineStreams`"""
+
+    def __init__(self, writer, streams):
+        self._writer = writer
+        self._streams = streams
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+    def write(self, data):
+        self._streams.idle = True
+        self._writer.write(data)
+
+    def writelines(self, data):
+        self._streams.idle = True
+        self._writer.writelines(data)
+
+    def drain(self):
+        return self._streams.write(self._writer.drain())
+
+
+class AsyncioWorker(Worker):
+    """\
+    Worker running one asyncio event loop, the uvloop one when it is
+    installed, and native coroutine handlers::
+
+        async def app(listener, reader, writer, address):
+            ...
+
+    Nothing is monkey patched, the handlers must not block the loop:
+    the heartbeat is sent from a task of the loop, a handler blocking
+    it for ``TIMEOUT`` seconds gets the worker killed.
+
+    At most ``WORKER_CONNECTIONS`` connections of a listener run at
+    once, the next ones wait for their turn once accepted. The handlers
+    get :class:`DeadlineStreams` when the listener has timeouts.
+
+    Needs python 3.7 or later.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.connections = set()
+
+    def init_process(self):
+        self.init_sockets()
+        for s in self.sockets:
+            # the transport can't be switched to TLS after reading the
+            # PROXY protocol header without losing the data following it
+            if s.conf.PROXY_PROTOCOL and s.conf.SSL_CONTEXT is not None:
+                raise RuntimeError("The asyncio worker doesn't support PROXY_PROTOCOL on TLS listeners (%s)" % s)
+
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        super().init_process()
+
+    def init_signals(self):
+        super().init_signals()
+        # run the handlers between two callbacks of the loop, the loop
+        # takes the wakeup fd over
+        for sig in self.SIGNALS:
+            self.loop.add_signal_handler(sig, self.signal, sig, None)
+
+    def load_handler(self):
+        super().load_handler()
+        for handler in self.handlers:
+            if not (inspect.iscoroutinefunction(handler) or
+                    inspect.iscoroutinefunction(getattr(handler, '__call__', None))):
+                raise RuntimeError("The asyncio worker needs coroutine handlers, %r isn't one" % handler)
+
+    def run(self):
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+
+    async def serve(self):
+        servers = []
+        for s, handler in zip(self.sockets, self.handlers):
+            servers.append(await self.start_server(s, handler))
+
+        await self.heartbeat()
+
+        # stop accepting, the listeners stay open for the other workers
+        for server in servers:
+            server.close()
+
+        # wait for the running connections until graceful_timeout
+        limit = self.loop.time() + self.config.GRACEFUL_TIMEOUT
+        while self.connections and self.loop.time() < limit:
+            self.notify()
+            await asyncio.wait(list(self.connections), timeout=1.0)
+
+        if self.connections:
+            self.logger.warning("Worker graceful timeout (pid:%s)" % self.pid)
+            for task in list(self.connections):
+                task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+
+    async def start_server(self, listener, handler):
+        conf = listener.conf
+        semaphore = asyncio.Semaphore(conf.WORKER_CONNECTIONS)
+        connected = partial(self.handle_connection, listener, handler, semaphore)
+
+        def protocol_factory():
+            return asyncio.StreamReaderProtocol(asyncio.StreamReader(), connected)
+
+        kwargs = {}
+        if conf.SSL_CONTEXT is not None and not conf.PROXY_PROTOCOL:
+            kwargs['ssl'] = conf.SSL_CONTEXT
+            # like the handshake of the other workers
+            if conf.IDLE_TIMEOUT or conf.READ_TIMEOUT:
+                kwargs['ssl_handshake_timeout'] = conf.IDLE_TIMEOUT or conf.READ_TIMEOUT
+
+        # the backlog is passed on since the loop calls listen() again
+        return await self.loop.create_server(
+            protocol_factory, sock=listener.sock, backlog=conf.BACKLOG, **kwargs)
+
+    async def heartbeat(self):
+        """\
+        Notify the arbiter until the worker stops, the delay of the
+        wake ups tells how long the loop has been blocked.
+        """
+        interval = min(1.0, self.timeout / 2.0) if self.timeout else 1.0
+        while self.alive:
+            self.notify()
+            started = self.loop.time()
+            await asyncio.sleep(interval)
+
+            lag = self.loop.time() - started - interval
+            if lag > LOOP_LAG_WARNING:
+                self.logger.warning("Event loop blocked for %.3fs (pid:%s)", lag, self.pid,
+                                    extra={"metric": "tunicorn.worker.loop_lag",
+                                           "value": lag,
+                                           "mtype": "histogram"})
+
+            if self.parent_id != os.getppid():
+                self.logger.info("Parent changed, shutting down: %s", self)
+                self.alive = False
+
+    async def handle_connection(self, listener, handler, semaphore, reader, writer):
+        address = writer.get_extra_info('peername')
+        conf = listener.conf
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            async with semaphore:
+                self.slot.start_request()
+                try:
+                    if conf.PROXY_PROTOCOL:
+                        address = await self.read_proxy_header(reader, conf.PROXY_PROTOCOL_TIMEOUT) or address
+                    if conf.IDLE_TIMEOUT or conf.READ_TIMEOUT or conf.WRITE_TIMEOUT:
+                        streams = DeadlineStreams(reader, writer, conf, self.connection_expired)
+                        reader, writer = streams.reader, streams.writer
+                    await handler(listener.sock, reader, writer, address)
+                except ProxyProtocolError as e:
+                    self.logger.debug("Dropping connection from %s: %s", address, e)
+                except DeadlineExpired as e:
+                    self.logger.debug("Closing connection from %s: %s", address, e)
+                except Exception:
+                    self.logger.exception("Error handling connection from %s", address)
+                finally:
+                    writer.close()
+                    self.finish_request()
+        finally:
+            self.connections.discard(task)
+
+    async def read_proxy_header(self, reader, timeout):
+        """\
+        Read the PROXY protocol header from the stream of a connection,
+        like :func:`tunicorn.proxy_protocol.read_proxy_header`. Only the
+        header is read, the data following it is left to the handler.
+        """
+        try:
+            return await asyncio.wait_for(self._read_proxy_header(reader), timeout)
+        except asyncio.TimeoutError:
+            raise ProxyProtocolError("No PROXY protocol header after %ss" % timeout)
+        except asyncio.IncompleteReadError:
+            raise ProxyProtocolError("Connection closed in the PROXY protocol header")
+        except asyncio.LimitOverrunError:
+            raise ProxyProtocolError("PROXY protocol v1 header too long")
+
+    async def _read_proxy_header(self, reader):
+        data = await reader.readexactly(len(V1_PREFIX))
+        if data == V1_PREFIX:
+            data += await reader.readuntil(b'\r\n')
+            return parse_v1(data)[1]
+        if not V2_SIGNATURE.startswith(data):
+            raise ProxyProtocolError("Missing PROXY protocol header")
+
+        data += await reader.readexactly(V2_HEADER.size - len(data))
+        length = V2_HEADER.unpack(data)[3]
+        # a too long header is refused by parse_v2 without reading it
+        if V2_HEADER.size + length <= MAX_HEADER_SIZE:
+            data += await reader.readexactly(length)
+        return parse_v2(data)[1]
@@ -10,10 +10,65 @@ except ImportError:
 from gevent.pool import Pool
 from gevent.server import StreamServer
 from gevent.socket import socket
+from tunicorn.deadlines import TimerWheel
 from .base import Worker
 import six
 
 
+class ConnectionBudget(Pool):
+    """\
+    Connections of all the listeners of a worker. The listeners stop
+    accepting once it is full, the other workers accept the next
+    connections of the shared listeners, and start again when one of
+    its connections ends.
+
+    The ``reserved`` connections of the listeners are on top of ``size``,
+    the budget is only full above ``size``.
+    """
+
+    def __init__(self, size, slot, reserved=0):
+        super(ConnectionBudget, self).__init__(size + reserved)
+        self.limit = size
+        self.slot = slot
+        self.servers = []
+
+    def full(self):
+        return len(self) >= self.limit
+
+    def add(self, greenlet, *args, **kwargs):
+        super(ConnectionBudget, self).add(greenlet, *args, **kwargs)
+        # linked after the pool, the slot is free once it is called
+        greenlet.rawlink(self.resume)
+        if self.full():
+            self.slot.saturate()
+
+    def resume(self, greenlet):
+        for server in self.servers:
+            if server.started:
+                server.start_accepting()
+
+
+class ListenerPool(Pool):
+    """\
+    Connections of one listener, at most its ``WORKER_CONNECTIONS``
+    and within the budget of the worker, except for its first
+    ``RESERVED_CONNECTIONS`` ones.
+    """
+
+    def __init__(self, size, budget, reserved=0):
+        super(ListenerPool, self).__init__(size)
+        self.budget = budget
+        self.reserved = reserved
+
+    def full(self):
+        return (super(ListenerPool, self).full() or
+                (self.budget.full() and len(self) >= self.reserved))
+
+    def add(self, greenlet, *args, **kwargs):
+        self.budget.add(greenlet, *args, **kwargs)
+        super(ListenerPool, self).add(greenlet, *args, **kwargs)
+
+
 class GeventWorker(Worker):
     def patch(self):
         from gevent import monkey
@@ -32,9 +87,6 @@ class GeventWorker(Worker):
                                       _sock=s))
         self.sockets = sockets
 
-    # def handle(self, listener, client, addr):
-    #     pass
-
     # --------------------------------------------------
     # signals handler methods
     # --------------------------------------------------
@@ -45,18 +97,30 @@ class GeventWorker(Worker):
 
     def run(self):
         servers = []
-        ssl_args = {}
-
-        for s in self.sockets:
+        # WORKER_CONNECTIONS is the budget of the worker, the one of a
+        # listener only caps its share
+        budget = ConnectionBudget(self.worker_connections, self.slot,
+                                  sum(l.conf.RESERVED_CONNECTIONS for l in self.listeners))
+
+        if any(l.conf.IDLE_TIMEOUT or l.conf.READ_TIMEOUT or l.conf.WRITE_TIMEOUT
+               for l in self.listeners):
+            # one greenlet for the deadlines of all the connections
+            self.deadlines = TimerWheel(time.time())
+            gevent.spawn(self.expire_deadlines)
+
+        for s, listener, handler in zip(self.sockets, self.listeners, self.handlers):
             s.setblocking(1)
-            pool = Pool(self.worker_connections)
+            pool = ListenerPool(listener.conf.WORKER_CONNECTIONS, budget,
+                                listener.conf.RESERVED_CONNECTIONS)
 
-            # TODO(benjamin): process handler
-            hfun = partial(self.handler, s)
-            server = StreamServer(s, handle=hfun, spawn=pool, **ssl_args)
+            # the PROXY protocol header and the TLS handshake are handled
+            # in the greenlet of the connection, see Worker.init_connection
+            hfun = partial(self.handle, s, handler=handler, conf=listener.conf)
+            server = StreamServer(s, handle=hfun, spawn=pool)
 
             server.start()
             servers.append(server)
+            budget.servers.append(server)
 
         while self.alive:
             self.notify()
@@ -70,13 +134,8 @@ class GeventWorker(Worker):
             # Handle current requests until graceful_timeout
             ts = time.time()
             while time.time() - ts <= self.config.GRACEFUL_TIMEOUT:
-                accepting = 0
-                for server in servers:
-                    if server.pool.free_count() != server.pool.size:
-                        accepting += 1
-
-                # if no server is accepting a connection, we can exit
-                if not accepting:
+                # if no connection is running, we can exit
+                if not len(budget):
                     return
 
                 self.notify()
@@ -88,7 +147,14 @@ class GeventWorker(Worker):
         except:
             pass
 
+    def expire_deadlines(self):
+        while True:
+            gevent.sleep(self.deadlines.resolution)
+            self.deadlines.advance(time.time())
+
     def init_process(self):
+        self.init_sockets()
+
         # monkey patch here
         self.patch()
 
@@ -0,0 +1,155 @@
+import errno
+import os
+import socket
+import threading
+import time
+from functools import partial
+
+try:
+    import concurrent.futures as futures
+except ImportError:
+    raise RuntimeError("You need futures installed to use this worker with this python version.")
+
+try:
+    import selectors
+except ImportError:
+    try:
+        import selectors2 as selectors
+    except ImportError:
+        raise RuntimeError("You need selectors2 installed to use this worker with this python version.")
+
+from tunicorn.util import close_on_exec
+from .base import Worker
+
+
+class ThreadWorker(Worker):
+    """\
+    Worker accepting the connections in its main thread and running
+    each of them on a pool of ``THREADS`` threads, for handlers calling
+    blocking C extensions which release the GIL but can't be patched
+    by gevent.
+
+    At most ``WORKER_CONNECTIONS`` connections of a listener are running
+    or waiting for a thread, the listener isn't polled above it and the
+    connections wait in its accept queue instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ThreadWorker, self).__init__(*args, **kwargs)
+        self.threads = self.config.THREADS
+        self.tpool = None
+        self.poller = None
+        self.lock = threading.Lock()
+        self.futures = set()
+        # listener fd -> number of connections running or queued
+        self.nr_conns = {}
+
+    @classmethod
+    def capacity(cls, config):
+        # the connections waiting for a thread aren't active yet
+        return config.THREADS
+
+    def init_process(self):
+        self.init_sockets()
+        self.tpool = futures.ThreadPoolExecutor(max_workers=self.threads)
+        self.poller = selectors.DefaultSelector()
+        super(ThreadWorker, self).init_process()
+
+    def run(self):
+        listeners = {}
+        for s, handler in zip(self.sockets, self.handlers):
+            s.setblocking(0)
+            listeners[s.fileno()] = (s, handler)
+            self.nr_conns[s.fileno()] = 0
+            self.poller.register(s, selectors.EVENT_READ, (s, handler))
+        self.poller.register(self.PIPE[0], selectors.EVENT_READ)
+        polled = set(listeners)
+
+        while self.alive:
+            self.notify()
+
+            # stop polling the listeners with too many connections and
+            # poll them again once some have finished
+            with self.lock:
+                for fd, (s, handler) in listeners.items():
+                    full = self.nr_conns[fd] >= s.conf.WORKER_CONNECTIONS
+                    if full and fd in polled:
+                        self.poller.unregister(s)
+                        polled.discard(fd)
+                    elif not full and fd not in polled:
+                        self.poller.register(s, selectors.EVENT_READ, (s, handler))
+                        polled.add(fd)
+
+            if not polled:
+                futures.wait(self.running(), timeout=1.0,
+                             return_when=futures.FIRST_COMPLETED)
+                continue
+
+            for key, _ in self.poller.select(1.0):
+                if key.data is None:
+                    self.drain_pipe()
+                    continue
+                s, handler = key.data
+                self.accept(s, handler)
+
+            if self.parent_id != os.getppid():
+                self.logger.info("Parent changed, shutting down: %s", self)
+                break
+
+        # stop accepting, the listeners stay open for the other workers
+        self.poller.close()
+        self.tpool.shutdown(wait=False)
+
+        # wait for the running connections until graceful_timeout
+        limit = time.time() + self.config.GRACEFUL_TIMEOUT
+        while self.running() and time.time() < limit:
+            self.notify()
+            futures.wait(self.running(), timeout=1.0)
+
+        if self.running():
+            self.logger.warning("Worker graceful timeout (pid:%s)" % self.pid)
+
+    def running(self):
+        with self.lock:
+            return list(self.futures)
+
+    def drain_pipe(self):
+        try:
+            while os.read(self.PIPE[0], 1):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EINTR):
+                raise
+
+    def accept(self, listener, handler):
+        try:
+            client, address = listener.accept()
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED, errno.EINTR):
+                return
+            raise
+
+        client.setblocking(1)
+        close_on_exec(client.fileno())
+        future = self.tpool.submit(self.handle, listener.sock, client, address,
+                                   handler=handler, conf=listener.conf)
+        with self.lock:
+            self.nr_conns[listener.fileno()] += 1
+            self.futures.add(future)
+        future.add_done_callback(partial(self.finish_connection, listener.fileno(), client, address))
+
+    def finish_connection(self, fd, client, address, future):
+        with self.lock:
+            self.nr_conns[fd] -= 1
+            self.futures.discard(future)
+        # the main loop may be waiting to poll the listener again
+        self.wake_up()
+        try:
+            future.result()
+        except Exception:
+            self.logger.exception("Error handling connection from %s", address)
+        finally:
+            try:
+                client.close()
+            except socket.error:
+                pass
@@ -0,0 +1,160 @@
+import mmap
+import struct
+import threading
+import time
+from collections import namedtuple
+
+# slot states
+STATE_FREE = 0
+STATE_BOOTING = 1
+STATE_IDLE = 2
+STATE_BUSY = 3
+STATE_EXITING = 4
+
+STATE_NAMES = {
+    STATE_FREE: 'free',
+    STATE_BOOTING: 'booting',
+    STATE_IDLE: 'idle',
+    STATE_BUSY: 'busy',
+    STATE_EXITING: 'exiting'
+}
+
+# every slot takes SLOT_SIZE bytes, the unused tail is reserved so
+# that new fields don't change the layout of the scoreboard
+SLOT_SIZE = 128
+SLOT_FORMAT = struct.Struct('=iBB2xdQIdQQQQ')
+
+SlotRecord = namedtuple('SlotRecord', ['pid', 'state', 'recycle', 'heartbeat',
+                                       'requests', 'active', 'request_started',
+                                       'rss', 'uss', 'saturations', 'timeouts'])
+
+
+class WorkerSlot(object):
+    """The slot of one worker in the :class:`Scoreboard`
+
+    The slot is only written by its worker once forked, the arbiter
+    reads it without any system call. The connections of the threaded
+    workers update it from several threads, hence the lock.
+    """
+
+    def __init__(self, scoreboard, index):
+        self.scoreboard = scoreboard
+        self.index = index
+        self.offset = index * SLOT_SIZE
+        self.lock = threading.Lock()
+
+        self.pid = 0
+        self.state = STATE_BOOTING
+        self.recycle = 0
+        self.heartbeat = time.time()
+        self.requests = 0
+        self.active = 0
+        self.request_started = 0
+        self.rss = 0
+        self.uss = 0
+        self.saturations = 0
+        self.timeouts = 0
+        self.write()
+
+    def write(self):
+        SLOT_FORMAT.pack_into(self.scoreboard.buf, self.offset,
+                              self.pid, self.state, self.recycle, self.heartbeat,
+                              self.requests, self.active, self.request_started,
+                              self.rss, self.uss, self.saturations, self.timeouts)
+
+    def read(self):
+        return SlotRecord(*SLOT_FORMAT.unpack_from(self.scoreboard.buf, self.offset))
+
+    def notify(self):
+        with self.lock:
+            if self.state == STATE_BOOTING:
+                self.state = STATE_IDLE
+            self.heartbeat = time.time()
+            self.write()
+
+    def start_request(self):
+        with self.lock:
+            self.active += 1
+            self.state = STATE_BUSY
+            self.request_started = time.time()
+            self.write()
+
+    def finish_request(self):
+        with self.lock:
+            self.active -= 1
+            self.requests += 1
+            if not self.active:
+                self.state = STATE_IDLE
+                self.request_started = 0
+            self.write()
+
+    def saturate(self):
+        """Count one more time the worker stopped accepting because all
+        its connections were in use."""
+        with self.lock:
+            self.saturations += 1
+            self.write()
+
+    def count_timeout(self):
+        """Count one more connection closed by its idle, read or
+        write deadline."""
+        with self.lock:
+            self.timeouts += 1
+            self.write()
+
+    def request_recycle(self):
+        """Ask the arbiter to replace the worker, it keeps serving
+        until the replacement has booted."""
+        with self.lock:
+            self.recycle = 1
+            self.write()
+
+    def last_update(self):
+        return self.read().heartbeat
+
+    def close(self):
+        with self.lock:
+            self.state = STATE_EXITING
+            self.write()
+
+
+class Scoreboard(object):
+    """Shared memory table holding one fixed-size slot per worker
+
+    It must be created by the arbiter before forking the workers, the
+    anonymous mapping is then shared by all the processes.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.buf = mmap.mmap(-1, size * SLOT_SIZE)
+        self.free = list(range(size - 1, -1, -1))
+
+    def acquire(self, index=None, exclude=()):
+        """Allocate a slot for a new worker, ``None`` when the scoreboard is full
+
+        :param index: the slot to allocate if it is free, e.g. to respawn
+                      a worker in the slot it crashed in
+        :param exclude: the slots not to allocate otherwise, e.g. the ones
+                        of crashed workers backing off
+        """
+        if index is not None and index in self.free:
+            self.free.remove(index)
+            return WorkerSlot(self, index)
+        for i in range(len(self.free) - 1, -1, -1):
+            if self.free[i] not in exclude:
+                return WorkerSlot(self, self.free.pop(i))
+        return None
+
+    def release(self, slot):
+        self.buf[slot.offset:slot.offset + SLOT_SIZE] = b'\0' * SLOT_SIZE
+        self.free.append(slot.index)
+
+    def snapshot(self, slots):
+        """Read the given slots from a single copy of the scoreboard"""
+        buf = self.buf[:]
+        return dict((slot.index, SlotRecord(*SLOT_FORMAT.unpack_from(buf, slot.offset)))
+                    for slot in slots)
+
+    def close(self):
+        self.buf.close()
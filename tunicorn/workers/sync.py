@@ -0,0 +1,98 @@
+import errno
+import os
+import select
+import socket
+
+from tunicorn.util import close_on_exec
+from .base import Worker
+
+
+class SyncWorker(Worker):
+    """\
+    Blocking worker handling one connection at a time, for cpu bound
+    handlers which gain nothing from an event loop. The listeners are
+    shared with the other workers, the kernel wakes the worker waiting
+    in ``select`` when a connection comes in.
+    """
+
+    @classmethod
+    def capacity(cls, config):
+        return 1
+
+    def init_process(self):
+        self.init_sockets()
+        super(SyncWorker, self).init_process()
+
+    def run(self):
+        for s in self.sockets:
+            s.setblocking(0)
+
+        listeners = dict((s.fileno(), (s, handler))
+                         for s, handler in zip(self.sockets, self.handlers))
+        # wake up often enough to send the heartbeats in time
+        timeout = min(1.0, self.timeout / 2.0) if self.timeout else 1.0
+
+        while self.alive:
+            self.notify()
+
+            # accept the pending connections first, the select is only
+            # needed once every listener has been drained
+            accepted = False
+            for s, handler in listeners.values():
+                if self.accept(s, handler):
+                    accepted = True
+                    self.notify()
+                if not self.alive:
+                    return
+            if accepted:
+                continue
+
+            if self.parent_id != os.getppid():
+                self.logger.info("Parent changed, shutting down: %s", self)
+                return
+
+            ready = self.wait(list(listeners.keys()), timeout)
+            for fd in ready:
+                if fd in listeners:
+                    s, handler = listeners[fd]
+                    self.accept(s, handler)
+                    self.notify()
+
+    def wait(self, fds, timeout):
+        try:
+            ready = select.select(fds + [self.PIPE[0]], [], [], timeout)[0]
+        except (select.error, OSError) as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+        if self.PIPE[0] in ready:
+            try:
+                while os.read(self.PIPE[0], 1):
+                    pass
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EINTR):
+                    raise
+        return ready
+
+    def accept(self, listener, handler):
+        """Accept and handle one connection of ``listener``, return ``False``
+        when there was no pending connection."""
+        try:
+            client, address = listener.accept()
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED, errno.EINTR):
+                return False
+            raise
+
+        try:
+            client.setblocking(1)
+            close_on_exec(client.fileno())
+            self.handle(listener.sock, client, address, handler=handler, conf=listener.conf)
+        except Exception:
+            self.logger.exception("Error handling connection from %s", address)
+        finally:
+            try:
+                client.close()
+            except socket.error:
+                pass
+        return True